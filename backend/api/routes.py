@@ -1,26 +1,94 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from core.audio_processor import AudioProcessor
-from versions.cat_version import CatVersion
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request, Query
+from core.artifacts import ArtifactManager, create_artifact_index
+from core.downloads import TRANSCODE_FORMATS, make_etag, last_modified, is_not_modified, transcode_cached
+from core.jobs import JobScheduler, QueueFullError
+from core.uploads import (
+    stream_upload, sniff_archive_type, list_archive_members, extract_archive_member,
+    UploadTooLargeError, UnsupportedMediaError
+)
+from core.utils import encode_for_delivery, get_media_duration, DELIVERY_FORMATS
+from core import media_pipeline, metrics
+from core.warmup import Warmup, configured_steps
+from versions import registry
+from fastapi.responses import FileResponse, Response, PlainTextResponse, JSONResponse, StreamingResponse
 import os
 import re
-import subprocess
-import yt_dlp
+import json
 import shutil
 import time
-import uuid
-from datetime import datetime, timedelta
-import threading
-import logging
 import asyncio
+import threading
 
 router = APIRouter()
 
-processor = AudioProcessor()
-cat_processor = CatVersion()
-
-TEMP_FILES = {}  # Store temp file paths with their creation time
-CLEANUP_DELAY = 900  # Time in seconds to keep files ( 15 min)
+CLEANUP_DELAY = int(os.getenv("TEMP_FILE_CLEANUP_DELAY", "900"))  # Time in seconds to keep files ( 15 min)
+
+scheduler = JobScheduler()
+artifacts = ArtifactManager(
+    root="temp", ttl=CLEANUP_DELAY,
+    max_bytes=int(os.getenv("TEMP_MAX_MB", "10240")) * 1024 * 1024,
+    index=create_artifact_index(os.getenv("ARTIFACT_INDEX", "sqlite"), "temp")
+)
+
+# Processors pull in librosa/torch, so they are created on first use (or by warm-up), not at import
+_processor = None
+_processor_lock = threading.Lock()
+
+def get_processor():
+    """Returns the shared AudioProcessor, creating it on first use."""
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            from core.audio_processor import AudioProcessor
+            _processor = AudioProcessor()
+        return _processor
+
+def get_cat_processor():
+    """Returns the shared CatVersion, creating it on first use."""
+    return registry.get_version(CAT_MODE)
+
+def warm_up_model():
+    """Starts the Demucs workers and runs one short separation on each."""
+    processor = get_processor()
+    if processor.pool is not None:
+        processor.pool.warm_up()
+
+def warm_up_pitch():
+    """JIT-compiles the pitch tracking path in this process and its workers."""
+    from core.vocal_features import shared_extractor
+    shared_extractor().pitch_tracker.warm_up()
+
+def warm_up_meow():
+    """Loads every meow sample and prebuilds its grain bank over WARMUP_MEOW_SHIFTS semitones."""
+    min_shift, max_shift = (float(value) for value in os.getenv("WARMUP_MEOW_SHIFTS", "-12,12").split(","))
+    get_cat_processor().warm_up(min_shift, max_shift)
+
+WARMUP_FUNCTIONS = {"model": warm_up_model, "pitch": warm_up_pitch, "meow": warm_up_meow}
+warmup = Warmup({step: WARMUP_FUNCTIONS[step] for step in configured_steps()})
+
+def startup():
+    """Starts background services: the artifact sweeper and warm-up."""
+    artifacts.start()
+    warmup.start()
+
+def shutdown():
+    """Stops the worker pools that were started."""
+    if _processor is not None and _processor.pool is not None:
+        _processor.pool.shutdown()
+    registry.shutdown()
+
+VOCAL_MODE = "Vocal and Music"
+CAT_MODE = "Cat Version"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "500")) * 1024 * 1024
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+MAX_ARCHIVE_BYTES = int(os.getenv("MAX_ARCHIVE_MB", "2048")) * 1024 * 1024
+FORM_OVERHEAD_BYTES = 1024 * 1024  # Multipart boundaries and the small form fields
+# Largest request body each upload endpoint can accept, enforced on Content-Length before the form is parsed
+UPLOAD_BODY_LIMITS = {
+    "/process": MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES,
+    "/jobs": MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES,
+    "/batch": BATCH_MAX_ITEMS * MAX_UPLOAD_BYTES + MAX_ARCHIVE_BYTES + FORM_OVERHEAD_BYTES,
+}
 
 def sanitize_filename(filename):
     """Sanitize filename to avoid issues with special characters."""
@@ -28,10 +96,7 @@ def sanitize_filename(filename):
 
 def create_request_temp_folder():
     """Creates a unique temp folder for each request."""
-    request_id = str(uuid.uuid4())
-    temp_folder = f"temp/{request_id}"
-    os.makedirs(temp_folder, exist_ok=True)
-    return temp_folder
+    return artifacts.create_folder()
 
 def clear_temp_folder():
     """Clears the temp folder before processing a new request."""
@@ -40,13 +105,6 @@ def clear_temp_folder():
         shutil.rmtree(temp_folder)
     os.makedirs(temp_folder)
 
-def run_ffmpeg(command):
-    """Utility function to run FFmpeg commands and handle errors."""
-    result = subprocess.run(command, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"FFmpeg error: {result.stderr}")
-        raise Exception(f"FFmpeg failed: {result.stderr}")
-
 def validate_file_exists(file_path, error_message):
     """Ensure that a file exists and is non-empty."""
     if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
@@ -54,167 +112,497 @@ def validate_file_exists(file_path, error_message):
 
 def cleanup_temp_folder(folder_path):
     """Cleanup temp folder after processing."""
-    if os.path.exists(folder_path):
-        shutil.rmtree(folder_path)
-        
-        # Clean up tracking dictionary
-        paths_to_remove = [k for k, v in TEMP_FILES.items() if v['folder'] == folder_path]
-        for path in paths_to_remove:
-            TEMP_FILES.pop(path, None)
-
-def schedule_cleanup(folder_path, delay=CLEANUP_DELAY):
-    """Schedule folder cleanup after delay."""
-    def delayed_cleanup():
-        time.sleep(delay)
-        cleanup_temp_folder(folder_path)
-
-    cleanup_thread = threading.Thread(target=delayed_cleanup)
-    cleanup_thread.daemon = True
-    cleanup_thread.start()
+    artifacts.remove(folder_path)
+
+def schedule_cleanup(folder_path, delay=None):
+    """Schedule folder cleanup after delay (defaults to CLEANUP_DELAY)."""
+    artifacts.schedule_expiry(folder_path, delay)
 
 def track_temp_file(file_path, folder_path):
-    """Track temporary file for cleanup."""
-    normalized_path = os.path.normpath(file_path)
-    TEMP_FILES[normalized_path] = {
-        'created': datetime.now(),
-        'folder': folder_path
+    """Publish a temporary file for download, returning its artifact id."""
+    return artifacts.publish(file_path, folder_path)
+
+def cleanup_item_folders(items):
+    """Removes the request folders of batch items that were saved."""
+    for _, folder, _, _, _ in items:
+        if folder:
+            cleanup_temp_folder(folder)
+
+def publish_outputs(outputs, folder_path):
+    """Swaps each output path for an opaque artifact id the client can download on any worker."""
+    return {
+        name: track_temp_file(path, folder_path)
+        for name, path in outputs.items() if isinstance(path, str) and os.path.exists(path)
     }
-    logging.debug(f"Tracked file: {normalized_path}")
 
-@router.post("/process")
-async def process_file(
-    file: UploadFile = File(None), 
-    youtube_link: str = Form(None), 
-    mode: str = Form(...)
-):
-    temp_folder = create_request_temp_folder()
+def parse_modes(mode):
+    """Splits a mode field into version names; several versions can be rendered from one separation."""
+    return list(dict.fromkeys(name.strip() for name in (mode or "").split(",") if name.strip()))
+
+def validate_process_request(file, youtube_link, mode, meow_sample, output_format=None):
+    """Rejects bad /process and /jobs requests before any work is done."""
+    if mode != VOCAL_MODE:
+        names = parse_modes(mode)
+        unknown = [name for name in names if name not in registry.version_names()]
+        if not names or unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown mode: {', '.join(unknown) or mode}")
+    if not youtube_link and not file:
+        raise HTTPException(status_code=400, detail="No file or YouTube link provided.")
+    if meow_sample and CAT_MODE in parse_modes(mode) and meow_sample not in get_cat_processor().available_samples():
+        raise HTTPException(status_code=400, detail=f"Unknown meow sample: {meow_sample}")
+    if output_format and output_format not in DELIVERY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {output_format}")
+
+async def save_upload(file, temp_folder):
+    """Streams an uploaded file into the request temp folder, returning its path and content hash."""
+    safe_filename = sanitize_filename(file.filename)
+    file_path = os.path.join(temp_folder, safe_filename)
+    try:
+        # Streaming shares the event loop thread, so only wall time and memory are meaningful
+        with metrics.measure("upload", cpu=False):
+            _, content_hash = await stream_upload(file, file_path, MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedMediaError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    return file_path, content_hash
+
+def pipeline_stages(mode, youtube_link):
+    """Lists the stages a request will go through, in order."""
+    stages = ["download", "extract"] if youtube_link else []
+    stages.append("separate")
+    if mode != VOCAL_MODE:
+        stages.append("synthesize")
+    stages.append("merge")
+    return stages
+
+async def run_pipeline(temp_folder, mode, youtube_link=None, audio_path=None, meow_sample=None, job=None,
+                       content_hash=None, output_format=None):
+    """Runs download/extract, separation and the mode-specific stages for one request."""
+    metrics.REQUESTS_IN_FLIGHT.inc()
     try:
-        # 🔄 Handle file upload or YouTube download
+        video_path = None
         if youtube_link:
-            video_path = await asyncio.to_thread(download_youtube_video, youtube_link, temp_folder)
-            audio_path = await asyncio.to_thread(extract_audio, video_path, temp_folder)
-
-            # Track the downloaded and extracted files
-            track_temp_file(video_path, temp_folder)
-            track_temp_file(audio_path, temp_folder)
-
-        elif file:
-            safe_filename = sanitize_filename(file.filename)
-            file_path = os.path.join(temp_folder, safe_filename)
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
-            audio_path = file_path
-            track_temp_file(audio_path, temp_folder)
+            async with scheduler.stage("download", job):
+                video_path = await asyncio.to_thread(metrics.measured("download", download_youtube_video), youtube_link, temp_folder)
+
+            # Vocal and Music returns the extracted audio as a link, the voice versions only need it in memory
+            async with scheduler.stage("extract", job):
+                audio_path, audio = await asyncio.to_thread(metrics.measured("extract", extract_audio), video_path, temp_folder, mode == VOCAL_MODE)
         else:
-            raise HTTPException(status_code=400, detail="No file or YouTube link provided.")
+            audio = None
 
         # 🎵 Process audio
-        tracks = await asyncio.to_thread(processor.process_audio, audio_path, temp_folder)
+        async with scheduler.stage("separate", job):
+            tracks = await asyncio.to_thread(
+                metrics.measured("separate", get_processor().process_audio), audio_path or video_path, temp_folder, content_hash, audio
+            )
+
+        # Process based on mode and publish all output files
+        if mode == VOCAL_MODE:
+            outputs = await handle_vocal_music_mode(tracks, youtube_link, video_path, audio_path, temp_folder, job, output_format or "mp3")
+        else:
+            outputs = await handle_versions_mode(tracks, temp_folder, parse_modes(mode), meow_sample, job, output_format or "wav")
+        # Publishing hashes each output for its ETag, so keep it off the event loop
+        return await asyncio.to_thread(publish_outputs, outputs, temp_folder)
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+@router.post("/process")
+async def process_file(
+    file: UploadFile = File(None), 
+    youtube_link: str = Form(None), 
+    mode: str = Form(...),
+    meow_sample: str = Form(None),
+    output_format: str = Form(None),
+    debug: bool = Form(False)
+):
+    validate_process_request(file, youtube_link, mode, meow_sample, output_format)
 
-        # Process based on mode and track all output files
-        response = None
-        if mode == "Vocal and Music":
-            response = await handle_vocal_music_mode(tracks, youtube_link, video_path if youtube_link else None, audio_path, temp_folder)
-        elif mode == "Cat Version":
-            response = await asyncio.to_thread(handle_cat_version_mode, tracks, temp_folder)
-            if os.path.exists(response["final_meow_music"]):
-                track_temp_file(response["final_meow_music"], temp_folder)
+    # Artifact index calls can block on SQLite or the disk, so none of them run on the event loop
+    temp_folder = await asyncio.to_thread(create_request_temp_folder)
+    try:
+        with metrics.collect_timings(debug) as timings:
+            # 🔄 Handle file upload (YouTube links are downloaded by the pipeline)
+            audio_path, content_hash = (None, None) if youtube_link else await save_upload(file, temp_folder)
+            response = await run_pipeline(
+                temp_folder, mode, youtube_link, audio_path, meow_sample,
+                content_hash=content_hash, output_format=output_format
+            )
 
         # Schedule cleanup
-        schedule_cleanup(temp_folder)
+        await asyncio.to_thread(schedule_cleanup, temp_folder)
+        if timings is not None:
+            response["timings"] = timings
         return response
 
     except HTTPException as http_err:
-        if os.path.exists(temp_folder):
-            cleanup_temp_folder(temp_folder)
+        await asyncio.to_thread(cleanup_temp_folder, temp_folder)
         raise http_err
     except Exception as e:
-        if os.path.exists(temp_folder):
-            cleanup_temp_folder(temp_folder)
+        await asyncio.to_thread(cleanup_temp_folder, temp_folder)
         raise HTTPException(status_code=500, detail=str(e))
 
+def pipeline_job(temp_folder, mode, youtube_link=None, audio_path=None, meow_sample=None,
+                 content_hash=None, output_format=None, debug=False, upload_timings=None):
+    """Builds the run(job) coroutine function the scheduler calls for one queued request."""
+    async def run(job):
+        try:
+            # Runner tasks outlive requests, so the breakdown is collected per job here
+            with metrics.collect_timings(debug) as timings:
+                response = await run_pipeline(
+                    temp_folder, mode, youtube_link, audio_path, meow_sample, job,
+                    content_hash=content_hash, output_format=output_format
+                )
+        except Exception:
+            await asyncio.to_thread(cleanup_temp_folder, temp_folder)
+            raise
+        await asyncio.to_thread(schedule_cleanup, temp_folder)
+        result = {**response, "links": {name: f"/download/{artifact_id}" for name, artifact_id in response.items()}}
+        if timings is not None:
+            result["timings"] = (upload_timings or []) + timings
+        return result
+    return run
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(None),
+    youtube_link: str = Form(None),
+    mode: str = Form(...),
+    meow_sample: str = Form(None),
+    output_format: str = Form(None),
+    debug: bool = Form(False)
+):
+    """Queues a /process run and returns a job id to poll instead of holding the connection."""
+    validate_process_request(file, youtube_link, mode, meow_sample, output_format)
+    if scheduler.is_full():
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later.", headers={"Retry-After": "30"})
+
+    temp_folder = await asyncio.to_thread(create_request_temp_folder)
+    try:
+        with metrics.collect_timings(debug) as upload_timings:
+            audio_path, content_hash = (None, None) if youtube_link else await save_upload(file, temp_folder)
 
-async def merge_audio_with_video(audio_path, video_path, output_name, temp_folder):
-    """Merges audio with video asynchronously."""
-    output_path = os.path.join(temp_folder, output_name)
-    command = [
-        "ffmpeg", "-y", "-i", video_path, "-i", audio_path,
-        "-map", "0:v:0", "-map", "1:a:0", 
-        "-c:v", "copy", 
-        "-c:a", "aac", 
-        "-shortest", output_path
-    ]
-    await asyncio.to_thread(run_ffmpeg, command)
-    validate_file_exists(output_path, "Merged video file is missing or empty.")
-    return output_path
-
-async def handle_vocal_music_mode(tracks, youtube_link, video_path, audio_path, temp_folder):
-    """Handles Vocal and Music mode logic asynchronously."""
-    if youtube_link:
-        vocals_video, music_video = await asyncio.gather(
-            asyncio.to_thread(merge_audio_with_video, tracks["vocals"], video_path, "vocals_video.mp4", temp_folder),
-            asyncio.to_thread(merge_audio_with_video, tracks["accompaniment"], video_path, "music_video.mp4", temp_folder)
+        run = pipeline_job(
+            temp_folder, mode, youtube_link, audio_path, meow_sample,
+            content_hash=content_hash, output_format=output_format, debug=debug, upload_timings=upload_timings
+        )
+        job = scheduler.submit(run, pipeline_stages(mode, youtube_link))
+    except QueueFullError as e:
+        await asyncio.to_thread(cleanup_temp_folder, temp_folder)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except HTTPException:
+        await asyncio.to_thread(cleanup_temp_folder, temp_folder)
+        raise
+    except Exception as e:
+        await asyncio.to_thread(cleanup_temp_folder, temp_folder)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Reports a job's status, per-stage progress and, once completed, its result links."""
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return job.to_dict()
+
+async def save_archive(archive, temp_folder):
+    """Streams an uploaded zip archive into temp_folder and returns its path."""
+    archive_path = os.path.join(temp_folder, "batch.zip")
+    try:
+        await stream_upload(archive, archive_path, MAX_ARCHIVE_BYTES, sniff=sniff_archive_type, kind="archive")
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedMediaError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    return archive_path
+
+def extract_batch_archive(archive_path, max_items):
+    """
+    Unpacks every archive member into its own request folder.
+    Returns (name, folder, path, content_hash, error) per member; members that
+    fail the upload checks carry an error instead of a path.
+    """
+    items = []
+    for name in list_archive_members(archive_path, max_items):
+        folder = create_request_temp_folder()
+        file_path = os.path.join(folder, sanitize_filename(os.path.basename(name)))
+        try:
+            _, content_hash = extract_archive_member(archive_path, name, file_path, MAX_UPLOAD_BYTES)
+            items.append((name, folder, file_path, content_hash, None))
+        except Exception as e:
+            cleanup_temp_folder(folder)
+            items.append((name, None, None, None, str(e)))
+    return items
+
+def failed_item(error):
+    """run(job) for a batch item that was rejected before processing."""
+    async def run(job):
+        raise ValueError(error)
+    return run
+
+async def batch_results(batch):
+    """NDJSON lines: one per item as it finishes, then a summary of the whole batch."""
+    async for job in batch.iter_finished():
+        yield json.dumps({"event": "item", **job.to_dict()}) + "\n"
+    yield json.dumps({"event": "done", **batch.to_dict(include_items=False)}) + "\n"
+
+@router.post("/batch", status_code=202)
+async def submit_batch(
+    files: list[UploadFile] = File(None),
+    archive: UploadFile = File(None),
+    mode: str = Form(...),
+    meow_sample: str = Form(None),
+    output_format: str = Form(None),
+    stream: bool = Form(False)
+):
+    """
+    Processes several uploads, or a zip archive of them, as one batch on the
+    shared warm workers. Every file is saved before processing starts; items
+    are then pipelined, so while one is being separated another is synthesized
+    or merged. Answers 429 when the batch queue is full. With stream=true
+    the response is NDJSON with one line per finished item; otherwise poll
+    /batch/{batch_id} or read /batch/{batch_id}/results.
+    """
+    files = files or []
+    validate_process_request(files or archive, None, mode, meow_sample, output_format)
+    if len(files) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch holds {len(files)} files, the limit is {BATCH_MAX_ITEMS}.")
+    # Checked again on submit once archive members are counted; this avoids saving files that would be rejected
+    if scheduler.batch_room() < max(1, len(files)):
+        raise HTTPException(status_code=429, detail="Batch queue is full, retry later.", headers={"Retry-After": "30"})
+
+    items = []  # (name, folder, path, content_hash, error)
+    try:
+        for upload in files:
+            folder = await asyncio.to_thread(create_request_temp_folder)
+            try:
+                file_path, content_hash = await save_upload(upload, folder)
+                items.append((upload.filename, folder, file_path, content_hash, None))
+            except HTTPException as e:
+                # One bad file fails its own item, not the whole batch
+                await asyncio.to_thread(cleanup_temp_folder, folder)
+                items.append((upload.filename, None, None, None, e.detail))
+
+        if archive:
+            staging_folder = await asyncio.to_thread(create_request_temp_folder)
+            try:
+                archive_path = await save_archive(archive, staging_folder)
+                items += await asyncio.to_thread(extract_batch_archive, archive_path, BATCH_MAX_ITEMS - len(items))
+            except (UploadTooLargeError, UnsupportedMediaError) as e:
+                raise HTTPException(status_code=413 if isinstance(e, UploadTooLargeError) else 415, detail=str(e))
+            finally:
+                await asyncio.to_thread(cleanup_temp_folder, staging_folder)
+    except Exception:
+        await asyncio.to_thread(cleanup_item_folders, items)
+        raise
+
+    if not items:
+        raise HTTPException(status_code=400, detail="The batch contains no files.")
+
+    try:
+        batch = scheduler.submit_batch(
+            [
+                (name, failed_item(error) if error else pipeline_job(
+                    folder, mode, None, file_path, meow_sample, content_hash=content_hash, output_format=output_format
+                ))
+                for name, folder, file_path, content_hash, error in items
+            ],
+            pipeline_stages(mode, None)
         )
+    except QueueFullError as e:
+        await asyncio.to_thread(cleanup_item_folders, items)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+    if stream:
+        return StreamingResponse(batch_results(batch), media_type="application/x-ndjson", status_code=200)
+    return {
+        "batch_id": batch.id,
+        "status_url": f"/batch/{batch.id}",
+        "results_url": f"/batch/{batch.id}/results",
+        "items": [{"name": job.name, "job_id": job.id} for job in batch.jobs],
+    }
+
+@router.get("/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """Reports a batch's overall progress and every item's status and result links."""
+    batch = scheduler.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired batch: {batch_id}")
+    return batch.to_dict()
+
+@router.get("/batch/{batch_id}/results")
+async def stream_batch_results(batch_id: str):
+    """Streams the batch as NDJSON: finished items first, then the rest as they complete."""
+    batch = scheduler.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired batch: {batch_id}")
+    return StreamingResponse(batch_results(batch), media_type="application/x-ndjson")
+
+
+async def encode_stems(tracks, output_format):
+    """Encodes the lossless stems into the client's delivery format, in parallel."""
+    vocals, accompaniment = await asyncio.gather(
+        asyncio.to_thread(metrics.measured("encode", encode_for_delivery), tracks["vocals"], output_format),
+        asyncio.to_thread(metrics.measured("encode", encode_for_delivery), tracks["accompaniment"], output_format)
+    )
+    return {"vocals": vocals, "accompaniment": accompaniment}
 
-        # Track all files that need to be downloadable, including the original video
-        files_to_track = {
+async def handle_vocal_music_mode(tracks, youtube_link, video_path, audio_path, temp_folder, job=None, output_format="mp3"):
+    """Handles Vocal and Music mode logic asynchronously."""
+    if youtube_link:
+        async with scheduler.stage("merge", job):
+            # One ffmpeg run muxes both videos while the stems are encoded for download
+            (vocals_video, music_video), delivered = await asyncio.gather(
+                asyncio.to_thread(metrics.measured("mux", media_pipeline.mux_audio_tracks), video_path, [
+                    (tracks["vocals"], os.path.join(temp_folder, "vocals_video.mp4")),
+                    (tracks["accompaniment"], os.path.join(temp_folder, "music_video.mp4"))
+                ]),
+                encode_stems(tracks, output_format)
+            )
+
+        # All files that need to be downloadable, including the original video
+        return {
             "vocals_video": vocals_video,
             "music_video": music_video,
-            "vocals_link": tracks["vocals"],
-            "music_link": tracks["accompaniment"],
+            "vocals_link": delivered["vocals"],
+            "music_link": delivered["accompaniment"],
             "extracted_audio": audio_path,
             "original_video": video_path
         }
-
-        # Track each file asynchronously
-        await asyncio.gather(
-            *[asyncio.to_thread(track_temp_file, path, temp_folder) for path in files_to_track.values() if isinstance(path, str) and os.path.exists(path)]
-        )
-
-        return files_to_track
     else:
-        # Track the separated audio files
-        for path in [tracks["vocals"], tracks["accompaniment"]]:
-            if isinstance(path, str) and os.path.exists(path):
-                track_temp_file(path, temp_folder)
+        async with scheduler.stage("merge", job):
+            delivered = await encode_stems(tracks, output_format)
 
         return {
-            "vocals_link": tracks["vocals"],
-            "music_link": tracks["accompaniment"]
+            "vocals_link": delivered["vocals"],
+            "music_link": delivered["accompaniment"]
         }
     
-def handle_cat_version_mode(tracks, temp_folder):
-    """Handles Cat Version mode logic."""
-    meow_vocal_path = os.path.join(temp_folder, "meow_vocal_adjusted.wav")
-    final_meow_music = os.path.join(temp_folder, "final_meow_music.wav")
-
-    cat_processor.generate_meow_vocals(tracks["vocals"], meow_vocal_path)
-    validate_file_exists(meow_vocal_path, "Meow vocal generation failed.")
-
-    cat_processor.merge_meow_with_instrumental(tracks["accompaniment"], meow_vocal_path, final_meow_music)
-    validate_file_exists(final_meow_music, "Final meow music generation failed.")
+def vocal_features_for(vocal_file):
+    """
+    Decodes and analyzes a vocal stem once for every version in the request.
+    Returns None for stems long enough to be segmented; those are analyzed window by window instead.
+    """
+    from core.segmented import should_segment
+    from core.vocal_features import shared_extractor
+    if should_segment(get_media_duration(vocal_file)):
+        return None
+    return shared_extractor().extract(vocal_file)
+
+def version_output_name(version):
+    """Response key for a version's final mix, derived from its name if it does not set one."""
+    return version.output_name or sanitize_filename(version.name.lower().replace(" ", "_"))
+
+async def handle_versions_mode(tracks, temp_folder, names, meow_sample=None, job=None, output_format="wav"):
+    """Renders each requested voice version from one shared analysis of the vocal stem."""
+    versions = [registry.get_version(name) for name in names]
+    outputs = {}
+
+    async with scheduler.stage("synthesize", job):
+        features = await asyncio.to_thread(vocal_features_for, tracks["vocals"])
+        for version in versions:
+            output_name = version_output_name(version)
+            vocal_path = os.path.join(temp_folder, f"{output_name}_vocals.wav")
+            await asyncio.to_thread(
+                version.generate_transformed_vocals, tracks["vocals"], vocal_path,
+                features=features, sample_name=meow_sample
+            )
+            validate_file_exists(vocal_path, f"{version.name} vocal generation failed.")
+            outputs[output_name] = vocal_path
+
+    async with scheduler.stage("merge", job):
+        for version in versions:
+            output_name = version_output_name(version)
+            final_path = os.path.join(temp_folder, f"{output_name}.wav")
+            await asyncio.to_thread(metrics.measured("mix", version.merge_with_instrumental), tracks["accompaniment"], outputs[output_name], final_path)
+            validate_file_exists(final_path, f"Final {version.name} music generation failed.")
+            outputs[output_name] = await asyncio.to_thread(metrics.measured("encode", encode_for_delivery), final_path, output_format)
+
+    return outputs
+
+@router.get("/stats")
+async def cache_stats():
+    """Reports cache hit/miss counters and temp artifact usage."""
+    return {
+        "artifacts": await asyncio.to_thread(artifacts.stats),
+        "stem_cache": _processor.stem_cache.stats() if _processor else None,
+        "versions": registry.stats()
+    }
 
-    return {"final_meow_music": final_meow_music}
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests; 503 once warm-up has failed for good, so it gets restarted."""
+    if warmup.has_failed():
+        return JSONResponse({"status": "failed", "warmup": warmup.to_dict()}, status_code=503)
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness: 200 once warm-up has finished, 503 while it runs or if it failed."""
+    status = warmup.to_dict()
+    return JSONResponse(status, status_code=200 if warmup.is_ready() else 503)
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency/CPU/memory histograms and queue gauges for this worker, Prometheus text format."""
+    metrics.QUEUE_DEPTH.set(scheduler.queue_depth())
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/samples")
+async def list_meow_samples():
+    """Lists the meow samples available for Cat Version."""
+    return {"samples": get_cat_processor().available_samples()}
+
+@router.api_route("/download/{artifact_id}", methods=["GET", "HEAD"])
+async def download_file(request: Request, artifact_id: str, output_format: str = Query(None, alias="format")):
+    """
+    Serves an artifact with Range, If-Range and conditional GET support. Optional
+    ?format=mp3|opus transcodes it once and serves the cached result afterwards.
+    """
+    # Artifact ids resolve through the shared index, so any worker can serve them
+    artifact = await asyncio.to_thread(artifacts.resolve, artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired artifact: {artifact_id}")
+
+    if not os.path.exists(artifact.path):
+        raise HTTPException(status_code=404, detail=f"File not found for artifact: {artifact_id}")
+
+    file_path, media_type = artifact.path, None
+    filename = os.path.basename(artifact.path)
+    if output_format:
+        if output_format not in TRANSCODE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported download format: {output_format}")
+        try:
+            file_path, written = await asyncio.to_thread(transcode_cached, artifact.path, artifact.digest, output_format)
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        # Charging may evict other folders to stay under the quota
+        await asyncio.to_thread(artifacts.charge, artifact.folder, written)
+        media_type = TRANSCODE_FORMATS[output_format][1]
+        filename = f"{os.path.splitext(filename)[0]}.{output_format}"
+
+    headers = {
+        "ETag": make_etag(artifact.digest, output_format),
+        "Last-Modified": last_modified(file_path),
+        # Content behind an id never changes, so clients may reuse it until it expires
+        "Cache-Control": f"private, max-age={CLEANUP_DELAY}, immutable",
+    }
+    if is_not_modified(request.headers, headers["ETag"], headers["Last-Modified"]):
+        return Response(status_code=304, headers=headers)
 
-@router.get("/download/{file_path:path}")
-async def download_file(file_path: str):
-    # Normalize path separators for comparison
-    file_path = os.path.normpath(file_path)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f"File not found at path: {file_path}")
-    
-    # Check if file is in our tracking system
-    if file_path not in TEMP_FILES:
-        raise HTTPException(status_code=404, detail=f"File not found in tracking system or expired: {file_path}")
-    
+    # FileResponse handles Range/If-Range and uses zero-copy pathsend when the server offers it
     return FileResponse(
-        file_path,
-        headers={"Content-Disposition": f"attachment; filename={os.path.basename(file_path)}"}
+        file_path, media_type=media_type,
+        headers={**headers, "Content-Disposition": f"attachment; filename={filename}"}
     )
 
 def download_youtube_video(youtube_url, temp_folder):
     """Downloads YouTube video and returns its path."""
+    import yt_dlp
+
     try:
         with yt_dlp.YoutubeDL({'quiet': True, 'noplaylist': True}) as ydl:
             info = ydl.extract_info(youtube_url, download=False)
@@ -251,43 +639,39 @@ def download_youtube_video(youtube_url, temp_folder):
         print(f"Unexpected error in download_youtube_video: {str(e)}")
         raise ValueError(f"Download failed: {str(e)}")
 
-def extract_audio(video_path, temp_folder):
-    """Extracts audio from video using FFmpeg."""
+def extract_audio(video_path, temp_folder, keep_wav=True):
+    """
+    Extracts audio from video using FFmpeg. Short inputs are decoded straight
+    into memory for separation (the WAV, if kept, comes from the same run);
+    long inputs go through a WAV file for segmented processing.
+    Returns (audio_path or None, audio array or None).
+    """
+    from core.segmented import should_segment
+
     audio_output = os.path.join(temp_folder, f"{os.path.basename(video_path)}.wav")
-    command = ["ffmpeg", "-y", "-i", video_path, "-q:a", "0", "-map", "a", audio_output]
-    run_ffmpeg(command)
+    if should_segment(get_media_duration(video_path)):
+        media_pipeline.extract_audio(video_path, audio_output)
+        validate_file_exists(audio_output, "Extracted audio is missing or empty.")
+        return audio_output, None
+
+    processor = get_processor()
+    audio = media_pipeline.decode_audio(
+        video_path, processor.model_sample_rate, processor.model_channels,
+        wav_copy=audio_output if keep_wav else None
+    )
+    if audio.size == 0:
+        raise Exception("Extracted audio is missing or empty.")
+    if not keep_wav:
+        return None, audio
     validate_file_exists(audio_output, "Extracted audio is missing or empty.")
-    return audio_output
-
-def merge_audio_with_video(audio_path, video_path, output_name, temp_folder):
-    """Merges audio with video."""
-    output_path = os.path.join(temp_folder, output_name)
-    command = [
-        "ffmpeg", "-y", "-i", video_path, "-i", audio_path,
-        "-map", "0:v:0", "-map", "1:a:0", 
-        "-c:v", "copy", 
-        "-c:a", "aac", 
-        "-shortest", output_path
-    ]
-    run_ffmpeg(command)
-    validate_file_exists(output_path, "Merged video file is missing or empty.")
-    return output_path
+    return audio_output, audio
 
 def cleanup_expired_files():
     """Clean up expired temporary files."""
-    current_time = datetime.now()
-    expired_files = [
-        (path, data) for path, data in TEMP_FILES.items()
-        if (current_time - data['created']) > timedelta(seconds=CLEANUP_DELAY)
-    ]
-    
-    for path, data in expired_files:
-        if os.path.exists(data['folder']):
-            shutil.rmtree(data['folder'])
-        TEMP_FILES.pop(path, None)
+    return artifacts.sweep_expired()
 
 @router.post("/cleanup")
 async def force_cleanup():
     """Force cleanup of expired files."""
-    cleanup_expired_files()
-    return {"message": "Cleanup completed"}
\ No newline at end of file
+    removed = await asyncio.to_thread(cleanup_expired_files)
+    return {"message": "Cleanup completed", "removed_folders": removed}
\ No newline at end of file
@@ -1,8 +1,21 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from api import routes
 from api.routes import router
+from core.uploads import BodySizeLimitMiddleware
 
-app = FastAPI(debug=True)
+@asynccontextmanager
+async def lifespan(app):
+    # Warm-up runs in the background; /readyz reports when it is done
+    routes.startup()
+    yield
+    routes.shutdown()
+
+app = FastAPI(debug=True, lifespan=lifespan)
+
+# Added before CORS so it runs inside it and the 413 still carries CORS headers
+app.add_middleware(BodySizeLimitMiddleware, limits=routes.UPLOAD_BODY_LIMITS)
 
 origins = [
     "https://your-vercel-frontend.vercel.app",  # ✅ Vercel frontend URL
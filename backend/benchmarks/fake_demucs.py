@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import soundfile as sf
+
+class FakeSeparationPool:
+    """
+    Deterministic, CPU-cheap stand-in for SeparationPool: the center (mid)
+    channel becomes the vocals and the rest the accompaniment. It keeps the
+    pool's interface and file layout so everything around separation runs
+    unchanged, without torch or downloaded Demucs weights.
+    """
+
+    def __init__(self, sample_rate=44100):
+        self.sample_rate = sample_rate
+        self.calls = 0
+
+    def separate_array(self, wav):
+        """Splits a float32 (channels, samples) array into (vocals, accompaniment)."""
+        self.calls += 1
+        wav = np.asarray(wav, dtype=np.float32)
+        vocals = np.broadcast_to(wav.mean(axis=0, keepdims=True), wav.shape).copy()
+        return vocals, wav - vocals
+
+    def separate(self, input_path, output_dir):
+        """Same output files as SeparationPool.separate (float32 vocals.wav / no_vocals.wav)."""
+        wav, sr = sf.read(input_path, dtype="float32", always_2d=True)
+        vocals, accompaniment = self.separate_array(wav.T)
+
+        os.makedirs(output_dir, exist_ok=True)
+        stems = {
+            "vocals": os.path.join(output_dir, "vocals.wav"),
+            "accompaniment": os.path.join(output_dir, "no_vocals.wav"),
+        }
+        sf.write(stems["vocals"], vocals.T, sr, subtype="FLOAT")
+        sf.write(stems["accompaniment"], accompaniment.T, sr, subtype="FLOAT")
+        return stems
+
+    def shutdown(self):
+        pass
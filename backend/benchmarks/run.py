@@ -0,0 +1,277 @@
+"""
+Offline benchmarks for separation, Cat Version synthesis/mixing and the
+full /process flow, on synthetic signals with a deterministic fake Demucs.
+
+    cd backend
+    python -m benchmarks.run --durations 10,60 --output bench.json
+    python -m benchmarks.run --durations 10,60 --baseline bench.json
+
+Needs ffmpeg on PATH; no network, GPU or model download.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE_RATE = 44100
+DEFAULT_DURATIONS = (10, 60, 300, 1800)
+STAGES = ("separate_tracks", "generate_meow_vocals", "merge_meow_with_instrumental", "process_vocal", "process_cat")
+RESULTS_VERSION = 1
+
+def configure_environment(workdir):
+    """
+    Points every cache and temp directory into workdir before the app modules
+    are imported (they read their settings at import time). Stems are never
+    cached so each separation run is cold; other settings can be overridden
+    from the calling shell.
+    """
+    os.environ["STEM_CACHE_DIR"] = os.path.join(workdir, "cache", "stems")
+    os.environ["STEM_CACHE_MAX_MB"] = "0"
+    os.environ["MEOW_GRAIN_CACHE_DIR"] = ""
+    os.environ["MEOW_SAMPLE"] = "meow.wav"
+    os.environ.setdefault("ARTIFACT_INDEX", "memory")
+    os.environ.setdefault("DEMUCS_WORKERS", "1")
+    os.environ.setdefault("MAX_UPLOAD_MB", "4096")
+    os.environ.setdefault("TEMP_FILE_CLEANUP_DELAY", "3600")
+    os.chdir(workdir)  # data/cat and temp/ are resolved relative to the working directory
+
+def environment_info():
+    import numpy as np
+    import librosa
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "git_commit": commit,
+        "settings": {
+            name: os.environ[name] for name in sorted(os.environ)
+            if name.startswith(("PITCH_", "SEGMENT_", "MIX_", "MEOW_", "DEMUCS_", "JOB_"))
+        },
+    }
+
+class Bench:
+    """Synthetic inputs and app objects for one benchmark session."""
+
+    def __init__(self, workdir):
+        from benchmarks import signals
+        from benchmarks.fake_demucs import FakeSeparationPool
+
+        os.makedirs(os.path.join("data", "cat"), exist_ok=True)
+        signals.write_meow(os.path.join("data", "cat", "meow.wav"), SAMPLE_RATE)
+
+        from api import routes
+        self.routes = routes
+        self.processor = routes.get_processor()
+        self.processor.pool = FakeSeparationPool(self.processor.model_sample_rate)
+        self.cat = routes.get_cat_processor()
+        self.signals = signals
+        self.inputs_dir = os.path.join(workdir, "inputs")
+        os.makedirs(self.inputs_dir, exist_ok=True)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from fastapi.testclient import TestClient
+            from app import app
+            self._client = TestClient(app)
+        return self._client
+
+    def inputs(self, duration):
+        """Writes (once) the song and its clean stems for a duration."""
+        prefix = os.path.join(self.inputs_dir, f"{duration}s")
+        song = f"{prefix}_song.wav"
+        if not os.path.exists(song):
+            self.signals.write_song(song, duration, SAMPLE_RATE, seed=duration)
+            self.signals.write_stems(f"{prefix}_vocals.wav", f"{prefix}_instrumental.wav", duration, SAMPLE_RATE, seed=duration)
+        return {
+            "song": song,
+            "vocals": f"{prefix}_vocals.wav",
+            "instrumental": f"{prefix}_instrumental.wav",
+            "meow": f"{prefix}_meow.wav",
+        }
+
+    def reset_caches(self):
+        """Drops in-memory meow caches so every run starts cold."""
+        self.cat.samples.clear()
+        self.cat.grain_banks.clear()
+
+    def prepare(self, stage, duration):
+        """Creates inputs a stage needs but should not be timed for."""
+        paths = self.inputs(duration)
+        if stage == "merge_meow_with_instrumental" and not os.path.exists(paths["meow"]):
+            self.cat.generate_meow_vocals(paths["vocals"], paths["meow"])
+
+    def run_stage(self, stage, duration, scratch):
+        """Runs one stage once; returns extra fields for the run record."""
+        paths = self.inputs(duration)
+        if stage == "separate_tracks":
+            self.processor.separate_tracks(paths["song"], scratch)
+        elif stage == "generate_meow_vocals":
+            self.cat.generate_meow_vocals(paths["vocals"], paths["meow"])
+        elif stage == "merge_meow_with_instrumental":
+            self.cat.merge_meow_with_instrumental(paths["instrumental"], paths["meow"], os.path.join(scratch, "final.wav"))
+        elif stage in ("process_vocal", "process_cat"):
+            return self._process(paths["song"], "Vocal and Music" if stage == "process_vocal" else "Cat Version")
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+        return {}
+
+    def _process(self, song, mode):
+        with open(song, "rb") as f:
+            response = self.client.post(
+                "/process", data={"mode": mode, "debug": "true"},
+                files={"file": (os.path.basename(song), f, "audio/wav")}
+            )
+        if response.status_code != 200:
+            raise RuntimeError(f"/process failed with {response.status_code}: {response.text}")
+        return {"breakdown": response.json().get("timings")}
+
+def measure_run(bench, stage, duration):
+    """Times one run of a stage and returns its record."""
+    from core import metrics
+
+    bench.prepare(stage, duration)
+    bench.reset_caches()
+    scratch = tempfile.mkdtemp(prefix=f"{stage}-", dir=os.getcwd())
+    try:
+        # The API thread does the /process work, so only this thread's wall time is meaningful there
+        with metrics.collect_timings() as timings, metrics.measure("bench", cpu=not stage.startswith("process")):
+            extra = bench.run_stage(stage, duration, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    # The outer measurement finishes last; anything before it was measured inside the stage
+    record = {key: value for key, value in timings[-1].items() if key != "stage"}
+    record["breakdown"] = timings[:-1]
+    record.update(extra)
+    record["throughput"] = round(duration / record["wall_seconds"], 3) if record["wall_seconds"] else None
+    return record
+
+def summarize(stage, duration, runs):
+    walls = [run["wall_seconds"] for run in runs]
+    wall = statistics.median(walls)
+    cpus = [run["cpu_seconds"] for run in runs if run.get("cpu_seconds") is not None]
+    return {
+        "stage": stage,
+        "duration": duration,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(statistics.median(cpus), 4) if cpus else None,
+        "throughput": round(duration / wall, 3) if wall else None,
+        "peak_rss_bytes": max(run["peak_rss_bytes"] for run in runs),
+        "runs": runs,
+    }
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """
+    Lines comparing median throughput and peak RSS against a baseline result
+    file, plus whether anything regressed beyond the tolerances.
+    """
+    previous = {(entry["stage"], entry["duration"]): entry for entry in baseline["results"]}
+    lines, regressed = [], False
+    for entry in results:
+        old = previous.get((entry["stage"], entry["duration"]))
+        if old is None or not old.get("throughput") or not entry.get("throughput"):
+            lines.append(f"{entry['stage']:<30} {entry['duration']:>6}s  (no baseline)")
+            continue
+        speed = entry["throughput"] / old["throughput"]
+        memory = entry["peak_rss_bytes"] / old["peak_rss_bytes"] if old["peak_rss_bytes"] else 1.0
+        flags = []
+        if speed < 1 - tolerance:
+            flags.append("SLOWER")
+        if memory > 1 + memory_tolerance:
+            flags.append("MORE MEMORY")
+        regressed = regressed or bool(flags)
+        lines.append(
+            f"{entry['stage']:<30} {entry['duration']:>6}s  throughput x{speed:.2f}  "
+            f"peak RSS x{memory:.2f}  {' '.join(flags)}".rstrip()
+        )
+    return lines, regressed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline AudioMagic pipeline benchmarks.")
+    parser.add_argument("--durations", default=",".join(str(d) for d in DEFAULT_DURATIONS),
+                        help="Comma separated input lengths in seconds (default: 10,60,300,1800)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage and duration; the median is reported")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed throughput drop (fraction)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed peak RSS growth (fraction)")
+    parser.add_argument("--workdir", help="Directory for inputs and caches (default: a fresh temp dir)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    durations = [int(value) for value in args.durations.split(",") if value]
+    stages = [value for value in args.stages.split(",") if value]
+    for stage in stages:
+        if stage not in STAGES:
+            raise SystemExit(f"Unknown stage: {stage}")
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="audiomagic-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    configure_environment(workdir)
+    bench = Bench(workdir)
+
+    results = []
+    for duration in durations:
+        bench.inputs(duration)
+        for stage in stages:
+            runs = [measure_run(bench, stage, duration) for _ in range(args.repeat)]
+            entry = summarize(stage, duration, runs)
+            results.append(entry)
+            print(
+                f"{stage:<30} {duration:>6}s  {entry['wall_seconds']:>9.3f}s wall  "
+                f"{entry['throughput']:>8.2f}x realtime  {entry['peak_rss_bytes'] / 2 ** 20:>8.0f} MiB peak"
+            )
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment_info(),
+        "config": {"durations": durations, "stages": stages, "repeat": args.repeat, "sample_rate": SAMPLE_RATE},
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.workdir is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if baseline is not None:
+        lines, regressed = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        print("\nCompared with baseline:")
+        print("\n".join(lines))
+        if regressed:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import numpy as np
+import soundfile as sf
+
+BLOCK_SECONDS = 30  # Long signals are rendered and written block by block
+
+def _note_sequence(duration, rng, min_note=0.25, max_note=0.8):
+    """Seeded melody: (start, end, midi note, voiced) spans covering duration seconds."""
+    notes = []
+    start = 0.0
+    while start < duration:
+        length = rng.uniform(min_note, max_note)
+        voiced = rng.random() > 0.2  # Leave gaps between phrases
+        notes.append((start, start + length, int(rng.integers(55, 76)), voiced))
+        start += length
+    return notes
+
+def _frequency_track(notes, times):
+    """Per-sample fundamental (Hz), voicing and current note start/end for the given absolute times."""
+    starts, ends, midi, voiced = (np.array(column) for column in zip(*notes))
+    index = np.clip(np.searchsorted(starts, times, side="right") - 1, 0, len(notes) - 1)
+    vibrato = 0.3 * np.sin(2 * np.pi * 5.5 * times)  # Semitones
+    f0 = 440.0 * 2 ** ((midi[index] + vibrato - 69) / 12)
+    return f0, voiced[index], starts[index], ends[index]
+
+def vocal_like(duration, sr, seed=0):
+    """
+    Yields float32 mono blocks of a sung-melody stand-in: a vibrato fundamental
+    with decaying harmonics, shaped into syllables, silent between phrases.
+    """
+    rng = np.random.default_rng(seed)
+    notes = _note_sequence(duration, rng)
+    total = int(duration * sr)
+    block = BLOCK_SECONDS * sr
+    phase = 0.0
+    for offset in range(0, total, block):
+        times = np.arange(offset, min(offset + block, total)) / sr
+        f0, voiced, note_start, note_end = _frequency_track(notes, times)
+        phases = phase + 2 * np.pi * np.cumsum(f0) / sr
+        phase = float(phases[-1] % (2 * np.pi))
+
+        signal = sum(np.sin(k * phases) / k ** 1.5 for k in range(1, 6))
+        attack = np.clip((times - note_start) / 0.03, 0, 1)
+        release = np.clip((note_end - times) / 0.05, 0, 1)
+        yield (0.3 * signal * attack * release * voiced).astype(np.float32)
+
+def instrumental_like(duration, sr, seed=1):
+    """
+    Yields float32 stereo (frames, 2) blocks: a chord pad panned apart from a
+    noise-burst drum pattern at 120 BPM, so left and right differ.
+    """
+    rng = np.random.default_rng(seed)
+    chords = rng.integers(45, 57, size=max(1, int(duration // 2) + 1))
+    total = int(duration * sr)
+    block = BLOCK_SECONDS * sr
+    beat = sr // 2
+    for offset in range(0, total, block):
+        index = np.arange(offset, min(offset + block, total))
+        times = index / sr
+        root = chords[(times // 2).astype(np.int64)]
+        pad = sum(np.sin(2 * np.pi * 440.0 * 2 ** ((root + step - 69) / 12) * times) for step in (0, 4, 7)) / 3
+
+        # Deterministic per block: the noise depends only on the seed and block offset
+        noise = np.random.default_rng((seed, offset)).standard_normal(len(index))
+        drums = noise * np.exp(-(index % beat) / (0.02 * sr))
+
+        left = 0.25 * pad + 0.05 * drums
+        right = 0.1 * pad + 0.2 * drums
+        yield np.stack([left, right], axis=1).astype(np.float32)
+
+def write_song(path, duration, sr, seed=0):
+    """
+    Writes a stereo 16-bit WAV song: the vocal sits in the center and the
+    instrumental is panned, which is what the fake separator splits on.
+    """
+    with sf.SoundFile(path, "w", samplerate=sr, channels=2, subtype="PCM_16") as out:
+        for vocal, instrumental in zip(vocal_like(duration, sr, seed), instrumental_like(duration, sr, seed + 1)):
+            out.write(np.clip(instrumental + vocal[:, None], -1.0, 1.0))
+    return path
+
+def write_stems(vocal_path, instrumental_path, duration, sr, seed=0):
+    """Writes the clean vocal (mono) and instrumental (stereo) as float WAV stems."""
+    with sf.SoundFile(vocal_path, "w", samplerate=sr, channels=1, subtype="FLOAT") as vocal_out, \
+            sf.SoundFile(instrumental_path, "w", samplerate=sr, channels=2, subtype="FLOAT") as instrumental_out:
+        for vocal, instrumental in zip(vocal_like(duration, sr, seed), instrumental_like(duration, sr, seed + 1)):
+            vocal_out.write(vocal)
+            instrumental_out.write(instrumental)
+    return vocal_path, instrumental_path
+
+def write_meow(path, sr, duration=0.6, seed=2):
+    """Writes a short meow stand-in: a falling, slightly noisy tone around 600 Hz."""
+    rng = np.random.default_rng(seed)
+    times = np.arange(int(duration * sr)) / sr
+    f0 = 700 - 250 * times / duration
+    phases = 2 * np.pi * np.cumsum(f0) / sr
+    envelope = np.sin(np.pi * times / duration) ** 2
+    signal = (np.sin(phases) + 0.4 * np.sin(2 * phases) + 0.02 * rng.standard_normal(len(times))) * envelope
+    sf.write(path, (0.5 * signal).astype(np.float32), sr, subtype="PCM_16")
+    return path
@@ -0,0 +1,420 @@
+import os
+import heapq
+import time
+import uuid
+import shutil
+import sqlite3
+import secrets
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from core.utils import dir_size, file_sha256
+
+ORPHAN_GRACE_SECONDS = 300  # Unindexed folders younger than this may belong to another worker
+MAX_JOB_SECONDS = int(os.getenv("MAX_JOB_SECONDS", "21600"))  # Indexed folders never finished after this were abandoned
+
+Artifact = namedtuple("Artifact", ["id", "path", "folder", "digest"])
+
+class ArtifactIndex(ABC):
+    """
+    Registry of request folders and the downloadable artifacts inside them.
+    Backends only store state; ArtifactManager owns the files on disk.
+    """
+
+    @abstractmethod
+    def add_folder(self, folder, created):
+        pass
+
+    @abstractmethod
+    def add_artifact(self, artifact_id, path, folder, digest):
+        pass
+
+    @abstractmethod
+    def lookup(self, artifact_id):
+        """Returns the Artifact for an id, or None if unknown/expired."""
+        pass
+
+    @abstractmethod
+    def set_expiry(self, folder, expires, size):
+        pass
+
+    @abstractmethod
+    def add_bytes(self, folder, size):
+        """Charges files created after expiry was scheduled (e.g. transcodes) to a folder."""
+        pass
+
+    @abstractmethod
+    def claim_folder(self, folder):
+        """Removes a folder from the index. True if this caller removed it (and should delete it)."""
+        pass
+
+    @abstractmethod
+    def claim_expired(self, now):
+        """Removes and returns every folder whose expiry has passed."""
+        pass
+
+    @abstractmethod
+    def claim_stale(self, created_before):
+        """Removes and returns folders never given an expiry that were created before the cutoff."""
+        pass
+
+    @abstractmethod
+    def next_expiry(self):
+        pass
+
+    @abstractmethod
+    def finished_folders(self):
+        """Returns (folder, bytes) for folders with a scheduled expiry, oldest first."""
+        pass
+
+    @abstractmethod
+    def has_folder(self, folder):
+        pass
+
+    @abstractmethod
+    def stats(self):
+        pass
+
+class MemoryArtifactIndex(ArtifactIndex):
+    """In-process index. Only valid when a single process serves all requests."""
+
+    def __init__(self):
+        self._folders = {}  # folder -> {"created", "expires", "bytes", "artifacts"}
+        self._artifacts = {}  # artifact id -> Artifact
+        self._expiry_heap = []  # (expires, folder); stale entries are skipped lazily
+        self._lock = threading.Lock()
+
+    def add_folder(self, folder, created):
+        with self._lock:
+            self._folders[folder] = {"created": created, "expires": None, "bytes": 0, "artifacts": set()}
+
+    def add_artifact(self, artifact_id, path, folder, digest):
+        with self._lock:
+            entry = self._folders.get(folder)
+            if entry is None:
+                return False
+            entry["artifacts"].add(artifact_id)
+            self._artifacts[artifact_id] = Artifact(artifact_id, path, folder, digest)
+            return True
+
+    def lookup(self, artifact_id):
+        with self._lock:
+            return self._artifacts.get(artifact_id)
+
+    def set_expiry(self, folder, expires, size):
+        with self._lock:
+            entry = self._folders.get(folder)
+            if entry is not None:
+                entry["expires"] = expires
+                entry["bytes"] = size
+                heapq.heappush(self._expiry_heap, (expires, folder))
+
+    def add_bytes(self, folder, size):
+        with self._lock:
+            entry = self._folders.get(folder)
+            if entry is not None:
+                entry["bytes"] += size
+
+    def claim_folder(self, folder):
+        with self._lock:
+            entry = self._folders.pop(folder, None)
+            if entry is None:
+                return False
+            for artifact_id in entry["artifacts"]:
+                self._artifacts.pop(artifact_id, None)
+            return True
+
+    def claim_expired(self, now):
+        expired = []
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires, folder = heapq.heappop(self._expiry_heap)
+                entry = self._folders.get(folder)
+                if entry is not None and entry["expires"] == expires:
+                    expired.append(folder)
+        return [folder for folder in expired if self.claim_folder(folder)]
+
+    def claim_stale(self, created_before):
+        with self._lock:
+            stale = [
+                folder for folder, entry in self._folders.items()
+                if entry["expires"] is None and entry["created"] < created_before
+            ]
+        return [folder for folder in stale if self.claim_folder(folder)]
+
+    def next_expiry(self):
+        with self._lock:
+            return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def finished_folders(self):
+        with self._lock:
+            finished = sorted(
+                (entry["created"], folder, entry["bytes"]) for folder, entry in self._folders.items()
+                if entry["expires"] is not None
+            )
+        return [(folder, size) for _, folder, size in finished]
+
+    def has_folder(self, folder):
+        with self._lock:
+            return folder in self._folders
+
+    def stats(self):
+        with self._lock:
+            return {
+                "folders": len(self._folders),
+                "artifacts": len(self._artifacts),
+                "bytes": sum(entry["bytes"] for entry in self._folders.values()),
+                "pending_expiry": sum(1 for entry in self._folders.values() if entry["expires"] is not None),
+            }
+
+class SQLiteArtifactIndex(ArtifactIndex):
+    """
+    Index stored in a SQLite database (WAL mode) in the temp folder, so every
+    uvicorn worker on this host sees the same artifacts. WAL relies on shared
+    memory, so the database must not live on a network filesystem shared by several hosts.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS folders (
+            folder TEXT PRIMARY KEY,
+            created REAL NOT NULL,
+            expires REAL,
+            bytes INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS folders_expires ON folders(expires);
+        CREATE TABLE IF NOT EXISTS artifacts (
+            id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            folder TEXT NOT NULL REFERENCES folders(folder) ON DELETE CASCADE,
+            digest TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS artifacts_folder ON artifacts(folder);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        # Built at import, before anything has created the temp root on a fresh checkout
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(artifacts)")}
+            if "digest" not in columns:
+                # Index created before artifacts carried a content hash
+                db.execute("ALTER TABLE artifacts ADD COLUMN digest TEXT NOT NULL DEFAULT ''")
+
+    def _connect(self):
+        """Returns this thread's connection (sqlite3 connections are not shared across threads)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    def add_folder(self, folder, created):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO folders (folder, created) VALUES (?, ?)", (folder, created))
+
+    def add_artifact(self, artifact_id, path, folder, digest):
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT INTO artifacts (id, path, folder, digest) VALUES (?, ?, ?, ?)",
+                    (artifact_id, path, folder, digest)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False  # Folder already removed
+
+    def lookup(self, artifact_id):
+        row = self._connect().execute(
+            "SELECT id, path, folder, digest FROM artifacts WHERE id = ?", (artifact_id,)
+        ).fetchone()
+        return Artifact(*row) if row else None
+
+    def set_expiry(self, folder, expires, size):
+        with self._connect() as db:
+            db.execute("UPDATE folders SET expires = ?, bytes = ? WHERE folder = ?", (expires, size, folder))
+
+    def add_bytes(self, folder, size):
+        with self._connect() as db:
+            db.execute("UPDATE folders SET bytes = bytes + ? WHERE folder = ?", (size, folder))
+
+    def claim_folder(self, folder):
+        with self._connect() as db:
+            return db.execute("DELETE FROM folders WHERE folder = ?", (folder,)).rowcount == 1
+
+    def claim_expired(self, now):
+        with self._connect() as db:
+            rows = db.execute(
+                "DELETE FROM folders WHERE expires IS NOT NULL AND expires <= ? RETURNING folder", (now,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_stale(self, created_before):
+        with self._connect() as db:
+            rows = db.execute(
+                "DELETE FROM folders WHERE expires IS NULL AND created < ? RETURNING folder", (created_before,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def next_expiry(self):
+        return self._connect().execute("SELECT MIN(expires) FROM folders").fetchone()[0]
+
+    def finished_folders(self):
+        return self._connect().execute(
+            "SELECT folder, bytes FROM folders WHERE expires IS NOT NULL ORDER BY created"
+        ).fetchall()
+
+    def has_folder(self, folder):
+        return self._connect().execute("SELECT 1 FROM folders WHERE folder = ?", (folder,)).fetchone() is not None
+
+    def stats(self):
+        db = self._connect()
+        folders, pending, size = db.execute(
+            "SELECT COUNT(*), COUNT(expires), COALESCE(SUM(bytes), 0) FROM folders"
+        ).fetchone()
+        artifacts = db.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        return {"folders": folders, "artifacts": artifacts, "bytes": size, "pending_expiry": pending}
+
+def create_artifact_index(backend, root):
+    """Builds the configured index backend ("sqlite" or "memory")."""
+    if backend == "memory":
+        return MemoryArtifactIndex()
+    if backend == "sqlite":
+        return SQLiteArtifactIndex(os.getenv("ARTIFACT_DB", os.path.join(root, ".artifacts.db")))
+    raise ValueError(f"Unknown artifact index backend: {backend}")
+
+class ArtifactManager:
+    """
+    Tracks per-request temp folders and hands out opaque ids for the
+    downloadable files inside them. A single sweeper thread removes folders as
+    they expire, a disk quota evicts the oldest finished folders first, and
+    folders no request owns are removed on start. State lives in a pluggable
+    ArtifactIndex so the workers on one host can share a temp folder.
+    """
+
+    def __init__(self, root="temp", ttl=900, max_bytes=10 * 1024 ** 3, index=None, sweep_interval=30):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval  # Upper bound on sleep, picks up other workers' expiries
+        os.makedirs(self.root, exist_ok=True)
+        self.index = index or MemoryArtifactIndex()
+        self._cond = threading.Condition()
+        self._sweeper = None
+
+    def start(self):
+        """Removes orphaned folders and starts the expiry sweeper (idempotent)."""
+        with self._cond:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="artifact-sweeper", daemon=True)
+        self.sweep_orphans()
+        self._sweeper.start()
+
+    def create_folder(self):
+        """Creates and registers a unique temp folder for a request."""
+        folder = os.path.join(self.root, str(uuid.uuid4()))
+        self.index.add_folder(folder, time.time())
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def publish(self, file_path, folder):
+        """
+        Registers a downloadable file inside folder and returns its opaque artifact id.
+        The content hash is recorded once here and later serves as the download ETag.
+        """
+        artifact_id = secrets.token_urlsafe(16)
+        normalized_path = os.path.normpath(file_path)
+        if not self.index.add_artifact(artifact_id, normalized_path, folder, file_sha256(normalized_path)):
+            raise FileNotFoundError(f"Temp folder no longer exists: {folder}")
+        logging.debug(f"Published {normalized_path} as {artifact_id}")
+        return artifact_id
+
+    def resolve(self, artifact_id):
+        """Returns the Artifact behind an id, or None if unknown or expired."""
+        return self.index.lookup(artifact_id)
+
+    def charge(self, folder, size):
+        """Adds bytes written into a finished folder to the disk quota."""
+        if size:
+            self.index.add_bytes(folder, size)
+            self.enforce_quota(keep=folder)
+
+    def schedule_expiry(self, folder, delay=None):
+        """Marks a finished folder for removal after delay seconds and charges its size to the quota."""
+        expires = time.time() + (self.ttl if delay is None else delay)
+        self.index.set_expiry(folder, expires, dir_size(folder))
+        with self._cond:
+            self._cond.notify()
+        # The folder's artifact ids are about to be handed to the client, so never evict it here
+        self.enforce_quota(keep=folder)
+
+    def remove(self, folder):
+        """Deletes a folder and forgets its artifacts."""
+        self.index.claim_folder(folder)
+        if os.path.exists(folder):
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def sweep_expired(self):
+        """Removes every folder whose expiry has passed. Returns how many were removed."""
+        expired = self.index.claim_expired(time.time())
+        for folder in expired:
+            shutil.rmtree(folder, ignore_errors=True)
+        return len(expired)
+
+    def enforce_quota(self, keep=None):
+        """Evicts the oldest finished folders (other than keep) until the indexed size fits max_bytes."""
+        total = self.index.stats()["bytes"]
+        if total <= self.max_bytes:
+            return
+        for folder, size in self.index.finished_folders():
+            if total <= self.max_bytes:
+                break
+            if folder == keep:
+                continue
+            logging.info(f"Disk quota exceeded, evicting {folder}")
+            self.remove(folder)
+            total -= size
+
+    def sweep_orphans(self):
+        """
+        Removes folders in the temp root that no request owns (e.g. left by a crash),
+        and indexed folders whose request never finished within MAX_JOB_SECONDS.
+        """
+        removed = 0
+        for folder in self.index.claim_stale(time.time() - MAX_JOB_SECONDS):
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for name in os.listdir(self.root):
+            folder = os.path.join(self.root, name)
+            if not os.path.isdir(folder) or self.index.has_folder(folder):
+                continue
+            if os.path.getmtime(folder) > cutoff:
+                continue  # Possibly being created by another worker right now
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+        if removed:
+            logging.info(f"Removed {removed} orphaned temp folder(s)")
+        return removed
+
+    def stats(self):
+        return {**self.index.stats(), "max_bytes": self.max_bytes}
+
+    def _sweep_loop(self):
+        while True:
+            next_expiry = self.index.next_expiry()
+            timeout = self.sweep_interval
+            if next_expiry is not None:
+                timeout = min(timeout, max(0.0, next_expiry - time.time()))
+            with self._cond:
+                self._cond.wait(timeout=timeout)
+            try:
+                self.sweep_expired()
+            except Exception as e:
+                logging.error(f"Artifact sweep failed: {e}")
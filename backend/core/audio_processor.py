@@ -1,16 +1,27 @@
 import os
 import subprocess
-import librosa
-import numpy as np
-from pydub import AudioSegment
+import soundfile as sf
 import logging
-from core.utils import pitch_shift_segment, stretch_meow_ffmpeg
+from core.utils import file_sha256, get_media_duration
+from core.segmented import should_segment, decode_to_wav, iter_windows, CrossfadeWriter
+from core.separation_worker import SeparationPool
+from core.stem_cache import StemCache
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 class AudioProcessor:
     def __init__(self):
         self.model_name = "htdemucs"
+        self.model_sample_rate = 44100
+        self.model_channels = 2
+        # 0 workers falls back to running the demucs CLI per request
+        self.workers = int(os.getenv("DEMUCS_WORKERS", "1"))
+        self.torch_threads = int(os.getenv("DEMUCS_TORCH_THREADS", "0")) or None
+        self.pool = SeparationPool(self.model_name, self.workers, self.torch_threads) if self.workers > 0 else None
+        self.stem_cache = StemCache(
+            root=os.getenv("STEM_CACHE_DIR", "cache/stems"),
+            max_bytes=int(os.getenv("STEM_CACHE_MAX_MB", "2048")) * 1024 * 1024
+        )
 
     def separate_tracks(self, input_path: str, temp_folder: str):
         """
@@ -23,9 +34,71 @@ class AudioProcessor:
         logging.info(f"Using model: {self.model_name}")
         logging.info(f"Demucs output directory: {demucs_output}")
 
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        demucs_output_path = os.path.join(demucs_output, self.model_name, base_name)
+
+        if self.pool is not None:
+            try:
+                if should_segment(get_media_duration(input_path)):
+                    return self.separate_tracks_segmented(input_path, demucs_output_path)
+                return self.pool.separate(input_path, demucs_output_path)
+            except Exception as e:
+                raise RuntimeError(f"Demucs separation failed: {str(e)}")
+        return self._separate_with_cli(input_path, demucs_output, demucs_output_path)
+
+    def separate_array(self, audio, output_dir: str):
+        """Separates an already decoded (channels, samples) array and writes float32 WAV stems."""
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            vocals, accompaniment = self.pool.separate_array(audio)
+        except Exception as e:
+            raise RuntimeError(f"Demucs separation failed: {str(e)}")
+
+        stems = {
+            "vocals": os.path.join(output_dir, "vocals.wav"),
+            "accompaniment": os.path.join(output_dir, "no_vocals.wav"),
+        }
+        sf.write(stems["vocals"], vocals.T, self.model_sample_rate, subtype="FLOAT")
+        sf.write(stems["accompaniment"], accompaniment.T, self.model_sample_rate, subtype="FLOAT")
+        return stems
+
+    def separate_tracks_segmented(self, input_path: str, output_dir: str):
+        """
+        Separates a long input window by window and crossfades the stems back
+        together, so peak memory depends on the window size, not the input length.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        decoded_path = os.path.join(output_dir, "input.wav")
+        decode_to_wav(input_path, decoded_path, self.model_sample_rate, self.model_channels)
+
+        stems = {
+            "vocals": os.path.join(output_dir, "vocals.wav"),
+            "accompaniment": os.path.join(output_dir, "no_vocals.wav"),
+        }
+        writers = {}
+        try:
+            for window, overlap in iter_windows(decoded_path, self.model_sample_rate):
+                if not writers:
+                    writers = {
+                        stem: CrossfadeWriter(path, self.model_sample_rate, self.model_channels, overlap)
+                        for stem, path in stems.items()
+                    }
+                vocals, accompaniment = self.pool.separate_array(window.T)
+                writers["vocals"].write(vocals.T)
+                writers["accompaniment"].write(accompaniment.T)
+        finally:
+            for writer in writers.values():
+                writer.close()
+            os.remove(decoded_path)
+
+        logging.info(f"Segmented separation finished: {output_dir}")
+        return stems
+
+    def _separate_with_cli(self, input_path: str, demucs_output: str, demucs_output_path: str):
+        """Runs the demucs CLI in a fresh process (DEMUCS_WORKERS=0)."""
         cmd = [
             "demucs", "-n", self.model_name, "--two-stems", "vocals",
-            "-o", demucs_output, "--mp3",
+            "-o", demucs_output, "--float32",
             input_path
         ]
 
@@ -35,16 +108,29 @@ class AudioProcessor:
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Demucs separation failed: {str(e)}")
 
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
-        demucs_output_path = os.path.join(demucs_output, self.model_name, base_name)
-
         return {
-            "vocals": os.path.join(demucs_output_path, "vocals.mp3"),
-            "accompaniment": os.path.join(demucs_output_path, "no_vocals.mp3")
+            "vocals": os.path.join(demucs_output_path, "vocals.wav"),
+            "accompaniment": os.path.join(demucs_output_path, "no_vocals.wav")
         }
 
-    def process_audio(self, input_path: str, temp_folder: str):
+    def process_audio(self, input_path: str, temp_folder: str, content_hash: str = None, audio=None):
         """
         Process audio and return paths for both vocals and accompaniment.
+        Stems for content that was already separated come from the stem cache.
+        audio optionally holds input_path already decoded to a float32
+        (channels, samples) array at the model rate, which skips decoding it again.
         """
-        return self.separate_tracks(input_path, temp_folder)
\ No newline at end of file
+        cache_key = self.stem_cache.key(content_hash or file_sha256(input_path), self.model_name)
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        stems_dir = os.path.join(temp_folder, "demucs", self.model_name, base_name)
+
+        tracks = self.stem_cache.get(cache_key, stems_dir)
+        if tracks is not None:
+            return tracks
+
+        if audio is not None and self.pool is not None:
+            tracks = self.separate_array(audio, stems_dir)
+        else:
+            tracks = self.separate_tracks(input_path, temp_folder)
+        self.stem_cache.put(cache_key, tracks)
+        return tracks
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import uuid
+import threading
+import subprocess
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+
+TRANSCODE_FORMATS = {
+    "mp3": (["-c:a", "libmp3lame", "-b:a", "192k"], "audio/mpeg"),
+    "opus": (["-c:a", "libopus", "-b:a", "128k"], "audio/ogg"),
+}
+TRANSCODE_DIR = ".transcoded"  # Per-request folder, so transcodes expire with their source
+
+_transcode_locks = {}  # output path -> [lock, callers holding or waiting on it]
+_transcode_locks_guard = threading.Lock()
+
+def make_etag(digest, variant=None):
+    """Strong ETag from an artifact's content hash (and the transcode format, if any)."""
+    return f'"{digest}-{variant}"' if variant else f'"{digest}"'
+
+def last_modified(path):
+    """HTTP-date for a file's modification time."""
+    return formatdate(os.stat(path).st_mtime, usegmt=True)
+
+def is_not_modified(request_headers, etag, modified):
+    """
+    Evaluates If-None-Match (preferred) or If-Modified-Since against a
+    representation, following RFC 9110 section 13.2.2.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison: W/"x" matches "x"
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@contextmanager
+def _output_lock(output_path):
+    """
+    Serializes work on one output path. The lock is shared by every caller
+    holding or waiting on it and dropped when the last one leaves, so the
+    table only holds paths that are being transcoded right now.
+    """
+    with _transcode_locks_guard:
+        entry = _transcode_locks.setdefault(output_path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _transcode_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _transcode_locks[output_path]
+
+def transcode_cached(path, digest, output_format):
+    """
+    Transcodes an artifact into a compressed delivery format once and reuses the
+    result. Returns (path, bytes_written) where bytes_written is 0 on a cache hit.
+    """
+    if output_format not in TRANSCODE_FORMATS:
+        raise ValueError(f"Unsupported transcode format: {output_format}")
+    codec_args, _ = TRANSCODE_FORMATS[output_format]
+    cache_dir = os.path.join(os.path.dirname(path), TRANSCODE_DIR)
+    output_path = os.path.join(cache_dir, f"{digest}.{output_format}")
+
+    with _output_lock(output_path):
+        if os.path.exists(output_path):
+            return output_path, 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write under a unique name and rename, so readers never see a partial file
+        staging_path = os.path.join(cache_dir, f".{uuid.uuid4().hex}.{output_format}")
+        command = ["ffmpeg", "-v", "error", "-y", "-i", path, "-vn", "-map", "0:a:0", *codec_args, staging_path]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0 or not os.path.exists(staging_path):
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            raise RuntimeError(f"FFmpeg transcode failed: {result.stderr}")
+        os.replace(staging_path, output_path)
+    return output_path, os.path.getsize(output_path)
@@ -0,0 +1,120 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from core.synthesis import render_meow_grain
+
+class MeowGrainBank:
+    """
+    Cache of pre-rendered meow grains keyed by (quantized semitone shift, duration).
+    Keeps a bounded in-memory LRU and optionally persists grains as .npy files
+    so they survive restarts.
+    """
+
+    def __init__(self, meow_y, sr, step=0.25, max_entries=512, cache_dir=None):
+        self.meow_y = np.asarray(meow_y, dtype=np.float32)
+        self.sr = sr
+        self.step = step
+        self.max_entries = max_entries
+        self.cache_dir = None
+        if cache_dir:
+            # Grains from different samples/rates never share a directory
+            digest = hashlib.sha1(self.meow_y.tobytes() + str(sr).encode()).hexdigest()[:16]
+            self.cache_dir = os.path.join(cache_dir, digest)
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._grains = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def quantize(self, semitone_shifts):
+        """Maps semitone shifts to integer steps of self.step."""
+        return np.round(np.asarray(semitone_shifts, dtype=np.float64) / self.step).astype(np.int64)
+
+    def key(self, semitone_shift, duration):
+        """Returns the bank key for a shift (semitones) and duration (seconds)."""
+        return int(self.quantize(semitone_shift)), int(round(duration * 1000))
+
+    def get(self, semitone_shift, duration):
+        """Returns the grain for a shift and duration, rendering it on a miss."""
+        return self.get_quantized(*self.key(semitone_shift, duration))
+
+    def get_quantized(self, shift_steps, duration_ms):
+        """Returns the grain for an already quantized (shift_steps, duration_ms) key."""
+        key = (int(shift_steps), int(duration_ms))
+        with self._lock:
+            grain = self._grains.get(key)
+            if grain is not None:
+                self._grains.move_to_end(key)
+                self.hits += 1
+                return grain
+
+        grain = self._load_from_disk(key)
+        if grain is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            grain = render_meow_grain(self.meow_y, self.sr, key[0] * self.step, key[1] / 1000.0)
+            grain.setflags(write=False)
+            self._save_to_disk(key, grain)
+            with self._lock:
+                self.misses += 1
+
+        with self._lock:
+            self._grains[key] = grain
+            self._grains.move_to_end(key)
+            while len(self._grains) > self.max_entries:
+                self._grains.popitem(last=False)
+        return grain
+
+    def prebuild(self, min_shift, max_shift, duration):
+        """Renders (or loads) every grain in [min_shift, max_shift] for a duration."""
+        duration_ms = int(round(duration * 1000))
+        for steps in range(int(self.quantize(min_shift)), int(self.quantize(max_shift)) + 1):
+            self.get_quantized(steps, duration_ms)
+        logging.info(f"Grain bank prebuilt: {self.stats()}")
+
+    def stats(self):
+        """Returns cache counters."""
+        with self._lock:
+            return {
+                "entries": len(self._grains),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _grain_path(self, key):
+        return os.path.join(self.cache_dir, f"{key[0] * self.step:+.4f}st_{key[1]}ms.npy")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._grain_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            grain = np.load(path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Discarding unreadable grain {path}: {e}")
+            return None
+        grain.setflags(write=False)
+        return grain
+
+    def _save_to_disk(self, key, grain):
+        if not self.cache_dir:
+            return
+        path = self._grain_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, grain)
+            os.replace(tmp_path, path)  # Atomic, so readers never see partial grains
+        except OSError as e:
+            logging.warning(f"Could not persist grain {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,248 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from core import metrics
+
+STAGES = ("download", "extract", "separate", "synthesize", "merge")
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at its maximum depth."""
+
+class Job:
+    """State of one queued processing run, as reported to polling clients."""
+
+    def __init__(self, job_id, stages, name=None):
+        self.id = job_id
+        self.name = name  # Item name within a batch
+        self.status = "queued"
+        self.stage = None
+        self.stages = {stage: "pending" for stage in stages}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+
+    def start_stage(self, stage):
+        self.stage = stage
+        self.stages[stage] = "running"
+        self.updated = time.time()
+
+    def finish_stage(self, stage):
+        self.stages[stage] = "done"
+        self.updated = time.time()
+
+    def is_finished(self):
+        return self.status in ("completed", "failed")
+
+    def to_dict(self):
+        done = sum(1 for state in self.stages.values() if state == "done")
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stages,
+            "progress": round(done / len(self.stages), 2) if self.stages else 1.0,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+class Batch:
+    """
+    Jobs submitted together. Each job's result is published as soon as it
+    finishes, in completion order, for streaming clients.
+    """
+
+    def __init__(self, batch_id, jobs):
+        self.id = batch_id
+        self.jobs = jobs
+        self.finished = []  # Jobs in completion order
+        self.created = time.time()
+        self.updated = self.created
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def status(self):
+        return "completed" if len(self.finished) == len(self.jobs) else "running"
+
+    async def mark_finished(self, job):
+        async with self._changed:
+            self.finished.append(job)
+            self.updated = time.time()
+            self._changed.notify_all()
+
+    async def iter_finished(self):
+        """Yields every job as it finishes (already finished ones first) until the batch is done."""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.finished) > sent)
+                pending = self.finished[sent:]
+            for job in pending:
+                yield job
+            sent += len(pending)
+            if sent == len(self.jobs):
+                return
+
+    def to_dict(self, include_items=True):
+        summary = {
+            "batch_id": self.id,
+            "status": self.status,
+            "total": len(self.jobs),
+            "completed": sum(1 for job in self.finished if job.status == "completed"),
+            "failed": sum(1 for job in self.finished if job.status == "failed"),
+            "created": self.created,
+            "updated": self.updated,
+        }
+        if include_items:
+            summary["items"] = [job.to_dict() for job in self.jobs]
+        return summary
+
+class JobScheduler:
+    """
+    Bounded job queue with a fixed number of job runners, plus per-stage
+    concurrency limits shared by queued jobs and synchronous requests so
+    CPU-heavy stages (Demucs, synthesis) never oversubscribe the machine.
+    """
+
+    def __init__(self):
+        self.max_queue = int(os.getenv("JOB_QUEUE_MAX", "32"))
+        self.runners = int(os.getenv("JOB_RUNNERS", "2"))
+        self.retention = int(os.getenv("JOB_RETENTION", "900"))  # Seconds finished jobs stay pollable
+        self.stage_limits = {
+            stage: int(os.getenv(f"JOB_CONCURRENCY_{stage.upper()}", "1" if stage in ("separate", "synthesize") else "4"))
+            for stage in STAGES
+        }
+        self._semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.stage_limits.items()}
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self.batch_concurrency = int(os.getenv("BATCH_CONCURRENCY", "2"))  # Batch items in flight at once per batch
+        self.max_batch_items = int(os.getenv("BATCH_QUEUE_MAX", "100"))  # Unfinished items across all batches
+        self._runner_tasks = []
+        self.jobs = {}
+        self.batches = {}
+
+    @asynccontextmanager
+    async def stage(self, name, job=None):
+        """Holds a slot of the stage's concurrency limit and records job progress."""
+        wait_start = time.perf_counter()
+        async with self._semaphores[name]:
+            metrics.STAGE_WAIT_SECONDS.observe(time.perf_counter() - wait_start, name)
+            if job is not None:
+                job.start_stage(name)
+            yield
+            if job is not None:
+                job.finish_stage(name)
+
+    def submit(self, run, stages=STAGES):
+        """
+        Queues run(job), a coroutine function returning the job result.
+        Raises QueueFullError instead of letting the backlog grow unbounded.
+        """
+        self._prune_finished()
+        job = Job(str(uuid.uuid4()), stages)
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+        self.jobs[job.id] = job
+        self._ensure_runners()
+        return job
+
+    def submit_batch(self, items, stages=STAGES, concurrency=None):
+        """
+        Starts a batch of (name, run) items without going through the job queue.
+        At most concurrency items run at once, so while one item holds the
+        separation slot another can synthesize or merge; the per-stage limits
+        keep the shared warm workers from being oversubscribed. Raises
+        QueueFullError if the batch would exceed max_batch_items unfinished
+        items across all batches.
+        """
+        self._prune_finished()
+        pending = self.pending_batch_items()
+        if pending + len(items) > self.max_batch_items:
+            raise QueueFullError(
+                f"Batch queue is full ({pending} of {self.max_batch_items} batch items unfinished)"
+            )
+        jobs = [Job(str(uuid.uuid4()), stages, name=name) for name, _ in items]
+        batch = Batch(str(uuid.uuid4()), jobs)
+        for job in jobs:
+            self.jobs[job.id] = job
+        self.batches[batch.id] = batch
+        runs = [run for _, run in items]
+        batch.task = asyncio.create_task(self._run_batch(batch, runs, concurrency or self.batch_concurrency))
+        return batch
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def get_batch(self, batch_id):
+        return self.batches.get(batch_id)
+
+    def is_full(self):
+        return self._queue.full()
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def pending_batch_items(self):
+        return sum(len(batch.jobs) - len(batch.finished) for batch in self.batches.values())
+
+    def batch_room(self):
+        """How many more batch items can be accepted right now."""
+        return max(0, self.max_batch_items - self.pending_batch_items())
+
+    def _ensure_runners(self):
+        self._runner_tasks = [task for task in self._runner_tasks if not task.done()]
+        while len(self._runner_tasks) < self.runners:
+            self._runner_tasks.append(asyncio.create_task(self._run_jobs()))
+
+    async def _run_jobs(self):
+        while True:
+            job, run = await self._queue.get()
+            try:
+                await self._execute(job, run)
+            finally:
+                self._queue.task_done()
+
+    async def _run_batch(self, batch, runs, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def run_item(job, run):
+            async with slots:
+                await self._execute(job, run)
+            await batch.mark_finished(job)
+
+        await asyncio.gather(*(run_item(job, run) for job, run in zip(batch.jobs, runs)))
+
+    async def _execute(self, job, run):
+        job.status = "running"
+        try:
+            job.result = await run(job)
+            job.status = "completed"
+        except Exception as e:
+            logging.error(f"Job {job.id} failed during {job.stage}: {e}")
+            job.error = getattr(e, "detail", None) or str(e)
+            job.status = "failed"
+        finally:
+            job.updated = time.time()
+
+    def _prune_finished(self):
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in ("completed", "failed") and job.updated < cutoff
+        ]
+        for job_id in expired:
+            self.jobs.pop(job_id, None)
+        finished_batches = [
+            batch_id for batch_id, batch in self.batches.items()
+            if batch.status == "completed" and batch.updated < cutoff
+        ]
+        for batch_id in finished_batches:
+            self.batches.pop(batch_id, None)
@@ -0,0 +1,64 @@
+import os
+import subprocess
+
+def run_ffmpeg(command, capture_stdout=False):
+    """Runs an ffmpeg command, raising with its stderr on failure. Returns stdout bytes if captured."""
+    result = subprocess.run(
+        command, stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace")
+        print(f"FFmpeg error: {stderr}")
+        raise Exception(f"FFmpeg failed: {stderr}")
+    return result.stdout
+
+def build_mux_command(video_path, audio_outputs):
+    """
+    Builds one ffmpeg invocation that demuxes the video once and writes one
+    output per (audio_path, output_path) pair: copied video + AAC audio.
+    With ffmpeg 7+ (threaded transcoding) the outputs are encoded concurrently;
+    older versions encode them one after another in a single loop.
+    """
+    command = ["ffmpeg", "-y", "-i", video_path]
+    for audio_path, _ in audio_outputs:
+        command += ["-i", audio_path]
+    for index, (_, output_path) in enumerate(audio_outputs, start=1):
+        command += [
+            "-map", "0:v:0", "-map", f"{index}:a:0",
+            "-c:v", "copy",
+            "-c:a", "aac",
+            "-shortest", output_path
+        ]
+    return command
+
+def mux_audio_tracks(video_path, audio_outputs):
+    """Muxes each audio track with the video in a single ffmpeg run. Returns the output paths."""
+    run_ffmpeg(build_mux_command(video_path, audio_outputs))
+    outputs = [output_path for _, output_path in audio_outputs]
+    for output_path in outputs:
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            raise Exception(f"Merged video file is missing or empty: {output_path}")
+    return outputs
+
+def extract_audio(media_path, output_path):
+    """Extracts the first audio stream to a WAV file."""
+    run_ffmpeg(["ffmpeg", "-y", "-i", media_path, "-vn", "-map", "0:a:0", output_path])
+    return output_path
+
+def decode_audio(media_path, sr, channels, wav_copy=None):
+    """
+    Decodes the first audio stream straight into a float32 (channels, samples)
+    array through a pipe, without a temporary file. When wav_copy is given the
+    same ffmpeg run also writes the audio to that WAV path.
+    """
+    command = [
+        "ffmpeg", "-v", "error", "-y", "-i", media_path,
+        "-map", "0:a:0", "-vn", "-ac", str(channels), "-ar", str(sr), "-f", "f32le", "pipe:1"
+    ]
+    if wav_copy:
+        command += ["-map", "0:a:0", "-vn", wav_copy]
+    import numpy as np
+
+    raw = run_ffmpeg(command, capture_stdout=True)
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, channels).T.copy()
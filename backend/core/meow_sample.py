@@ -0,0 +1,89 @@
+import os
+import hashlib
+import logging
+import librosa
+import numpy as np
+
+DEFAULT_REF_PITCH = 300  # Hz, used when pyin finds no voiced frames
+
+class MeowSample:
+    """Decoded meow sample plus the analysis the synthesis path needs."""
+
+    def __init__(self, path, samples, sr, ref_pitch, rms, duration):
+        self.path = path
+        self.samples = samples
+        self.sr = sr
+        self.ref_pitch = ref_pitch
+        self.rms = rms
+        self.duration = duration
+
+def file_sha1(path, chunk_size=1 << 20):
+    """Hashes a file in chunks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def analyze_meow_sample(path, sr):
+    """Decodes a meow sample and extracts its reference pitch, RMS and duration."""
+    samples, _ = librosa.load(path, sr=sr)
+    f0, voiced, _ = librosa.pyin(
+        samples, fmin=librosa.note_to_hz('C2'),
+        fmax=librosa.note_to_hz('C7'), sr=sr
+    )
+    ref_pitch = float(np.nanmean(f0[voiced])) if np.any(voiced) else DEFAULT_REF_PITCH
+    rms = float(np.sqrt(np.mean(np.square(samples)))) if len(samples) else 0.0
+    duration = len(samples) / sr
+    return MeowSample(path, samples.astype(np.float32), sr, ref_pitch, rms, duration)
+
+def sidecar_path(path, sr):
+    """Returns the analysis cache file that sits next to the sample."""
+    return f"{path}.{sr}.analysis.npz"
+
+def load_meow_sample(path, sr):
+    """
+    Loads a meow sample's analysis from its sidecar cache, recomputing it
+    when the WAV's mtime and content hash no longer match.
+    """
+    cache_file = sidecar_path(path, sr)
+    mtime_ns = os.stat(path).st_mtime_ns
+    sha1 = None
+
+    if os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                valid = int(cached["mtime_ns"]) == mtime_ns
+                if not valid:
+                    # Touched but maybe not modified, only the hash can tell
+                    sha1 = file_sha1(path)
+                    valid = str(cached["sha1"]) == sha1
+                if valid:
+                    sample = MeowSample(
+                        path, cached["samples"], sr, float(cached["ref_pitch"]),
+                        float(cached["rms"]), float(cached["duration"])
+                    )
+            if valid:
+                if sha1 is not None:
+                    _write_sidecar(cache_file, sample, mtime_ns, sha1)  # Record the new mtime
+                return sample
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable meow analysis cache {cache_file}: {e}")
+
+    logging.info(f"Analyzing meow sample: {path}")
+    sample = analyze_meow_sample(path, sr)
+    _write_sidecar(cache_file, sample, mtime_ns, sha1 or file_sha1(path))
+    return sample
+
+def _write_sidecar(cache_file, sample, mtime_ns, sha1):
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(
+            tmp_file, samples=sample.samples, ref_pitch=sample.ref_pitch,
+            rms=sample.rms, duration=sample.duration, mtime_ns=mtime_ns, sha1=sha1
+        )
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logging.warning(f"Could not write meow analysis cache {cache_file}: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -0,0 +1,276 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Buckets cover sub-second cache hits up to the half-hour separations of long inputs
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES_BUCKETS = tuple(mb * 1024 * 1024 for mb in (128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+RSS_SAMPLE_INTERVAL = 0.05  # Seconds between RSS samples while a stage is running
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values, Prometheus style."""
+
+    def __init__(self, name, documentation, label_names=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                labels = list(zip(self.label_names, label_values))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = _format_labels(labels + [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class Gauge:
+    """Current value per label values; set directly or adjusted with inc/dec."""
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {} if self.label_names else {(): 0}
+        self._lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                labels = _format_labels(list(zip(self.label_names, label_values)))
+                lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+STAGE_WALL_SECONDS = Histogram("audiomagic_stage_wall_seconds", "Wall time per pipeline stage.", ["stage"])
+STAGE_CPU_SECONDS = Histogram(
+    "audiomagic_stage_cpu_seconds",
+    "CPU time of the thread running each pipeline stage plus the pool workers it waited on.", ["stage"]
+)
+STAGE_PEAK_RSS_BYTES = Histogram(
+    "audiomagic_stage_peak_rss_bytes",
+    "Peak resident memory of the largest process (API or pool worker) involved in each stage.",
+    ["stage"], buckets=BYTES_BUCKETS
+)
+STAGE_WAIT_SECONDS = Histogram(
+    "audiomagic_stage_wait_seconds", "Time spent waiting for a stage concurrency slot.", ["stage"]
+)
+STAGES_IN_FLIGHT = Gauge("audiomagic_stages_in_flight", "Stages currently running.", ["stage"])
+REQUESTS_IN_FLIGHT = Gauge("audiomagic_requests_in_flight", "Processing requests and jobs currently running.")
+QUEUE_DEPTH = Gauge("audiomagic_job_queue_depth", "Jobs waiting for a runner.")
+
+REGISTRY = [
+    STAGE_WALL_SECONDS, STAGE_CPU_SECONDS, STAGE_PEAK_RSS_BYTES, STAGE_WAIT_SECONDS,
+    STAGES_IN_FLIGHT, REQUESTS_IN_FLIGHT, QUEUE_DEPTH,
+]
+
+# Per-request timing breakdown, only collected while a request has enabled it
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+# Usage reported by pool workers for the stage being measured in this context
+_worker_usage = contextvars.ContextVar("worker_usage", default=None)
+
+def _max_rss():
+    """Lifetime high-water mark of this process's resident set, in bytes."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+def current_rss():
+    """Current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # No procfs (e.g. macOS): fall back to the lifetime high-water mark
+        return _max_rss()
+
+def _reset_peak_rss():
+    """Resets this process's peak RSS (Linux 4.0+) so the next read covers only what follows."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, since the last reset where supported."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return _max_rss()
+
+def run_in_worker(fn, *args):
+    """
+    Runs fn(*args) in a pool worker process and returns (result, cpu_seconds, peak_rss_bytes),
+    which the submitting thread hands to worker_result. CPU comes from getrusage rather than
+    thread_time because torch and numba spread the work over several threads.
+    """
+    import resource
+    _reset_peak_rss()
+    start = resource.getrusage(resource.RUSAGE_SELF)
+    result = fn(*args)
+    end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = (end.ru_utime - start.ru_utime) + (end.ru_stime - start.ru_stime)
+    return result, cpu_seconds, peak_rss()
+
+def worker_result(future):
+    """Waits for a run_in_worker future, charges its usage to the stage being measured and returns its result."""
+    result, cpu_seconds, peak_bytes = future.result()
+    _add_worker_usage(_worker_usage.get(), cpu_seconds, peak_bytes)
+    return result
+
+def _add_worker_usage(usage, cpu_seconds, peak_bytes):
+    if usage is not None:
+        usage["cpu_seconds"] += cpu_seconds
+        usage["peak_rss_bytes"] = max(usage["peak_rss_bytes"] or 0, peak_bytes)
+
+class _RssSampler:
+    """Samples RSS on one background thread while at least one stage is being measured."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._peaks = {}  # id -> one-element list holding a running stage's peak bytes
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, peak):
+        with self._lock:
+            self._peaks[id(peak)] = peak
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, peak):
+        with self._lock:
+            self._peaks.pop(id(peak), None)
+
+    def _run(self):
+        while True:
+            rss = current_rss()
+            with self._lock:
+                if not self._peaks:
+                    self._thread = None
+                    return
+                for peak in self._peaks.values():
+                    peak[0] = max(peak[0], rss)
+            time.sleep(self.interval)
+
+_sampler = _RssSampler()
+
+@contextmanager
+def measure(stage, cpu=True):
+    """
+    Records wall time, CPU time and peak RSS for the enclosed block. CPU time is
+    the current thread's plus whatever pool workers reported through
+    worker_result, so measure inside the worker thread (not around an await)
+    and pass cpu=False for blocks that share the event loop thread.
+    """
+    worker_usage = {"cpu_seconds": 0.0, "peak_rss_bytes": None}
+    usage_token = _worker_usage.set(worker_usage)
+    peak = [current_rss()]
+    _sampler.add(peak)
+    STAGES_IN_FLIGHT.inc(stage)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        _worker_usage.reset(usage_token)
+        worker_cpu = None
+        if worker_usage["peak_rss_bytes"] is not None:
+            worker_cpu = worker_usage["cpu_seconds"]
+            # Nested stages (e.g. pitch inside a benchmark run) also count toward the enclosing one
+            _add_worker_usage(_worker_usage.get(), worker_cpu, worker_usage["peak_rss_bytes"])
+        cpu_time = time.thread_time() - cpu_start + (worker_cpu or 0) if cpu else None
+        STAGES_IN_FLIGHT.dec(stage)
+        _sampler.remove(peak)
+        peak_rss = max(peak[0], current_rss(), worker_usage["peak_rss_bytes"] or 0)
+
+        STAGE_WALL_SECONDS.observe(wall, stage)
+        if cpu_time is not None:
+            STAGE_CPU_SECONDS.observe(cpu_time, stage)
+        STAGE_PEAK_RSS_BYTES.observe(peak_rss, stage)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append({
+                "stage": stage,
+                "wall_seconds": round(wall, 4),
+                "cpu_seconds": round(cpu_time, 4) if cpu_time is not None else None,
+                "peak_rss_bytes": peak_rss,
+                "worker_cpu_seconds": round(worker_cpu, 4) if worker_cpu is not None else None,
+                "worker_peak_rss_bytes": worker_usage["peak_rss_bytes"],
+            })
+        logging.debug(f"Stage {stage}: {wall:.3f}s wall")
+
+def measured(stage, fn):
+    """Wraps fn so each call is measured as stage; handy with asyncio.to_thread."""
+    def wrapper(*args, **kwargs):
+        with measure(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def collect_timings(enabled=True):
+    """
+    Collects a per-stage timing breakdown for the enclosed request (or job) and
+    yields the list it fills, or None when disabled. Worker threads started via
+    asyncio.to_thread inherit it through the context.
+    """
+    timings = [] if enabled else None
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+from core.segmented import decode_to_wav
+
+LIMIT_MODES = ("clip", "peak", "soft", "none")
+MIX_BLOCK_SIZE = 65536  # Frames read, mixed and written per block
+DEFAULT_SAMPLE_RATE = 44100  # Only used when neither input has a header libsndfile can read
+SOFT_KNEE = 0.9  # Soft limiter starts bending the signal above this level
+
+def _stream_source(path, sr, channels, scratch_dir):
+    """
+    Returns (path, info) for a copy of the file that can be read block by block at sr.
+    Files libsndfile can read at that rate are used as they are; anything else
+    (resampling, mp3 stems from older cache entries) is decoded once by ffmpeg to a float WAV.
+    """
+    info = _header(path)
+    if info is not None and info.samplerate == sr:
+        return path, info
+    decoded = os.path.join(scratch_dir, f"{os.path.basename(path)}.{sr}.wav")
+    decode_to_wav(path, decoded, sr, info.channels if info else channels)
+    return decoded, sf.info(decoded)
+
+def _blocks(path, channels, block_size):
+    """Yields float32 (frames, channels) blocks, averaging and repeating to match channels."""
+    for block in sf.blocks(path, blocksize=block_size, dtype="float32", always_2d=True):
+        if block.shape[1] != channels:
+            block = np.repeat(block.mean(axis=1, keepdims=True), channels, axis=1)
+        yield block
+
+def _mixed_blocks(base_path, overlay_path, channels, base_gain, overlay_gain, block_size):
+    """
+    Sums aligned blocks of both files for the overlay's length (sample-accurate):
+    the base is truncated if longer and treated as silence once it runs out.
+    """
+    base_blocks = _blocks(base_path, channels, block_size)
+    for overlay in _blocks(overlay_path, channels, block_size):
+        block = overlay * overlay_gain
+        base = next(base_blocks, None)
+        if base is not None:
+            n = min(len(base), len(block))
+            block[:n] += base[:n] * base_gain
+        yield block
+
+def soft_limit(block, knee=SOFT_KNEE):
+    """Leaves samples below the knee untouched and bends louder ones smoothly toward 1.0."""
+    magnitude = np.abs(block)
+    over = magnitude > knee
+    bent = knee + (1.0 - knee) * np.tanh((magnitude[over] - knee) / (1.0 - knee))
+    block[over] = np.sign(block[over]) * bent
+    return block
+
+def mix_tracks(base_file, overlay_file, output_file, base_gain_db=0.0, overlay_gain_db=0.0,
+               limit="clip", subtype="PCM_16", block_size=MIX_BLOCK_SIZE):
+    """
+    Mixes overlay_file on top of base_file, aligned sample by sample to the overlay's length.
+    Both inputs are streamed block by block, so memory stays flat however long they are.
+    The output takes the base track's sample rate and the larger channel count.
+    limit: "clip" hard clips, "peak" scales the whole mix down if it would clip,
+    "soft" applies a soft knee limiter, "none" writes the raw sum (use a float subtype).
+    """
+    if limit not in LIMIT_MODES:
+        raise ValueError(f"Unknown limit mode: {limit}")
+
+    known = _header(base_file) or _header(overlay_file)
+    sr = known.samplerate if known else DEFAULT_SAMPLE_RATE
+    base_gain = np.float32(10 ** (base_gain_db / 20))
+    overlay_gain = np.float32(10 ** (overlay_gain_db / 20))
+
+    # Any decoded copies live next to the output (same volume) and go away with the mix
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as scratch_dir:
+        base_path, base_info = _stream_source(base_file, sr, 2, scratch_dir)
+        overlay_path, overlay_info = _stream_source(overlay_file, sr, 1, scratch_dir)
+        channels = max(base_info.channels, overlay_info.channels)
+
+        def mixed():
+            return _mixed_blocks(base_path, overlay_path, channels, base_gain, overlay_gain, block_size)
+
+        scale = np.float32(1.0)
+        if limit == "peak":
+            # First pass only measures, so the whole mix can be scaled without holding it in memory
+            peak = max((float(np.max(np.abs(block), initial=0.0)) for block in mixed()), default=0.0)
+            scale = np.float32(1.0 / peak) if peak > 1.0 else scale
+
+        with sf.SoundFile(output_file, "w", samplerate=sr, channels=channels, subtype=subtype) as out:
+            for block in mixed():
+                if limit == "peak":
+                    block *= scale
+                elif limit == "soft":
+                    block = soft_limit(block)
+                if limit != "none":
+                    np.clip(block, -1.0, 1.0, out=block)
+                out.write(block)
+    return output_file
+
+def _header(path):
+    """Reads a file's header without decoding it, or None for non-libsndfile formats."""
+    try:
+        return sf.info(path)
+    except RuntimeError:
+        return None
@@ -0,0 +1,131 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import librosa
+import numpy as np
+from core.metrics import run_in_worker, worker_result
+from core.utils import cpu_share
+
+PITCH_METHODS = ("pyin", "pyin_fast", "yin")
+HOP_LENGTH = 512
+FMIN = librosa.note_to_hz('C2')
+FMAX = librosa.note_to_hz('C7')
+YIN_RMS_THRESHOLD = 0.01  # Frames quieter than about -40 dBFS count as unvoiced for yin
+
+def analyze_pitch(y, sr, method="pyin"):
+    """
+    Frame-level f0, voicing and RMS for a mono signal, hop HOP_LENGTH, centered frames.
+    pyin is the reference; pyin_fast runs pyin at half the sample rate; yin skips
+    the HMM entirely and derives voicing from loudness.
+    """
+    rms = librosa.feature.rms(y=y, hop_length=HOP_LENGTH)[0]
+    n_frames = len(rms)
+
+    if method == "pyin":
+        f0, voiced, _ = librosa.pyin(y, fmin=FMIN, fmax=FMAX, sr=sr, hop_length=HOP_LENGTH)
+    elif method == "pyin_fast":
+        half_sr = sr // 2
+        y_half = librosa.resample(y, orig_sr=sr, target_sr=half_sr)
+        # Half the hop at half the rate keeps frame times identical to the full-rate analysis
+        f0, voiced, _ = librosa.pyin(
+            y_half, fmin=FMIN, fmax=min(FMAX, half_sr / 4), sr=half_sr,
+            frame_length=1024, hop_length=HOP_LENGTH // 2
+        )
+    elif method == "yin":
+        f0 = librosa.yin(y, fmin=FMIN, fmax=FMAX, sr=sr, hop_length=HOP_LENGTH)
+        voiced = librosa.util.fix_length(rms, size=len(f0)) > YIN_RMS_THRESHOLD
+    else:
+        raise ValueError(f"Unknown pitch tracking method: {method}")
+
+    f0 = librosa.util.fix_length(np.where(np.isnan(f0), 0, f0), size=n_frames)
+    voiced = librosa.util.fix_length(voiced.astype(bool), size=n_frames)
+    return f0, voiced, rms
+
+def _analyze_chunk(segment, sr, method, keep_start, keep_end):
+    f0, voiced, rms = analyze_pitch(segment, sr, method)
+    return f0[keep_start:keep_end], voiced[keep_start:keep_end], rms[keep_start:keep_end]
+
+class PitchTracker:
+    """
+    Runs pitch/voicing/RMS analysis in overlapping chunks across a process pool.
+    Each chunk is analyzed with extra context frames on both sides, which are
+    dropped before the frame-aligned results are concatenated.
+    """
+
+    def __init__(self, method="pyin", workers=None, chunk_seconds=30.0, context_seconds=1.0):
+        if method not in PITCH_METHODS:
+            raise ValueError(f"Unknown pitch tracking method: {method}")
+        self.method = method
+        self.workers = workers or cpu_share()
+        self.chunk_seconds = chunk_seconds
+        self.context_seconds = context_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                logging.info(f"Starting {self.workers} pitch tracking worker(s)")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _run_all(self, calls):
+        """
+        Runs each (fn, *args) call on the pool and returns the results in order,
+        charging worker CPU and memory to the stage measuring this call.
+        """
+        executor = self._get_executor()
+        try:
+            futures = [executor.submit(run_in_worker, *call) for call in calls]
+            return [worker_result(future) for future in futures]
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM); drop the pool so the next call starts fresh ones
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise RuntimeError(f"Pitch tracking worker crashed: {str(e)}")
+
+    def track(self, y, sr):
+        """Returns (f0, voiced_flag, rms, times) with unvoiced/undetected f0 set to 0."""
+        chunk_frames = max(1, int(self.chunk_seconds * sr) // HOP_LENGTH)
+        context_frames = max(4, int(self.context_seconds * sr) // HOP_LENGTH)
+        n_frames = 1 + len(y) // HOP_LENGTH
+
+        if self.workers <= 1 or n_frames <= chunk_frames:
+            f0, voiced, rms = analyze_pitch(y, sr, self.method)
+        else:
+            calls = []
+            for start in range(0, n_frames, chunk_frames):
+                end = min(start + chunk_frames, n_frames)
+                seg_start = max(0, start - context_frames)
+                seg_end = min(n_frames, end + context_frames)
+                segment = y[seg_start * HOP_LENGTH:seg_end * HOP_LENGTH]
+                calls.append((_analyze_chunk, segment, sr, self.method, start - seg_start, end - seg_start))
+            results = self._run_all(calls)
+            f0, voiced, rms = (np.concatenate(parts) for parts in zip(*results))
+
+        times = librosa.times_like(f0, sr=sr, hop_length=HOP_LENGTH)
+        return f0, voiced, rms, times
+
+    def warm_up(self, sr=44100, seconds=2.0):
+        """
+        JIT-compiles the analysis path (librosa's numba kernels) here and in each
+        pool worker by tracking a short tone, so the first request skips compilation.
+        """
+        t = np.arange(int(seconds * sr)) / sr
+        tone = (0.3 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+        analyze_pitch(tone, sr, self.method)
+        if self.workers > 1:
+            # One task per worker at once makes the executor spawn the whole pool
+            self._run_all([(analyze_pitch, tone, sr, self.method)] * self.workers)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
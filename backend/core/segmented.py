@@ -0,0 +1,75 @@
+import os
+import subprocess
+import numpy as np
+import soundfile as sf
+
+# Inputs longer than the threshold are processed window by window
+SEGMENT_SECONDS = float(os.getenv("SEGMENT_SECONDS", "60"))
+SEGMENT_OVERLAP_SECONDS = float(os.getenv("SEGMENT_OVERLAP_SECONDS", "2"))
+SEGMENT_THRESHOLD_SECONDS = float(os.getenv("SEGMENT_THRESHOLD_SECONDS", "600"))
+
+def should_segment(duration):
+    """True when an input is long enough to be processed in windows."""
+    return SEGMENT_THRESHOLD_SECONDS > 0 and duration > SEGMENT_THRESHOLD_SECONDS
+
+def decode_to_wav(input_path, output_path, sr, channels):
+    """Decodes any ffmpeg-readable input to a float WAV without loading it into memory."""
+    command = [
+        "ffmpeg", "-y", "-i", input_path, "-vn", "-ac", str(channels),
+        "-ar", str(sr), "-c:a", "pcm_f32le", output_path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg decode failed: {result.stderr}")
+    return output_path
+
+def iter_windows(path, sr, window_seconds=None, overlap_seconds=None):
+    """
+    Yields (window, overlap_samples) pairs read from a WAV file, each window
+    sharing its first overlap_samples with the end of the previous one.
+    Windows are float32 arrays shaped (frames, channels).
+    """
+    window = int((window_seconds or SEGMENT_SECONDS) * sr)
+    overlap = int((overlap_seconds if overlap_seconds is not None else SEGMENT_OVERLAP_SECONDS) * sr)
+    for block in sf.blocks(path, blocksize=window, overlap=overlap, dtype="float32", always_2d=True):
+        yield block, overlap
+
+class CrossfadeWriter:
+    """
+    Stitches consecutive overlapping windows into one file with a linear
+    crossfade across each overlap. Only one overlap's worth of audio is held
+    back between writes, so memory does not grow with the output length.
+    """
+
+    def __init__(self, path, sr, channels, overlap, subtype="FLOAT"):
+        self.overlap = overlap
+        self._file = sf.SoundFile(path, "w", samplerate=sr, channels=channels, subtype=subtype)
+        self._tail = None
+
+    def write(self, block):
+        block = np.array(block, dtype=np.float32, copy=True)
+        if block.ndim == 1:
+            block = block[:, None]
+
+        if self._tail is not None:
+            n = min(len(self._tail), len(block))
+            fade_in = np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+            block[:n] = self._tail[:n] * (1.0 - fade_in) + block[:n] * fade_in
+
+        if self.overlap > 0 and len(block) > self.overlap:
+            self._file.write(block[:-self.overlap])
+            self._tail = block[-self.overlap:]
+        else:
+            self._tail = block
+
+    def close(self):
+        if self._tail is not None:
+            self._file.write(self._tail)
+            self._tail = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,142 @@
+import os
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from core.metrics import run_in_worker, worker_result
+from core.utils import cpu_share
+
+# Loaded once per worker process by _init_worker
+_model = None
+
+def _init_worker(model_name, torch_threads):
+    """Loads the Demucs model into a worker process."""
+    global _model
+    import torch
+    from demucs.pretrained import get_model
+
+    torch.set_num_threads(torch_threads)
+    _model = get_model(model_name)
+    _model.eval()
+    logging.info(f"Demucs worker {os.getpid()} loaded {model_name} ({torch_threads} threads)")
+
+def _separate_tensor(wav):
+    """Runs the model on a (channels, samples) tensor, returning (vocals, accompaniment)."""
+    import torch
+    from demucs.apply import apply_model
+
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / (ref.std() + 1e-8)
+
+    with torch.no_grad():
+        sources = apply_model(_model, wav[None], device="cpu", split=True, overlap=0.25, progress=False)[0]
+    sources = sources * (ref.std() + 1e-8) + ref.mean()
+
+    vocals = sources[_model.sources.index("vocals")]
+    accompaniment = sources.sum(dim=0) - vocals
+    return vocals, accompaniment
+
+def _separate_array(wav):
+    """Separates a float32 (channels, samples) array, returning numpy stems."""
+    import torch
+
+    vocals, accompaniment = _separate_tensor(torch.from_numpy(np.ascontiguousarray(wav, dtype=np.float32)))
+    return vocals.numpy(), accompaniment.numpy()
+
+def _warm_up_worker(seconds):
+    """Runs one silent separation at the model's own rate and channel count."""
+    import torch
+
+    silence = torch.zeros((_model.audio_channels, int(seconds * _model.samplerate)))
+    _separate_tensor(silence)
+
+def _separate_file(input_path, output_dir):
+    """
+    Separates one file into vocals/no_vocals stems, same as demucs --two-stems vocals.
+    Stems are written once as float32 WAV so later stages read them back losslessly.
+    """
+    import soundfile as sf
+    from demucs.audio import AudioFile
+
+    wav = AudioFile(input_path).read(
+        streams=0, samplerate=_model.samplerate, channels=_model.audio_channels
+    )
+    vocals, accompaniment = _separate_tensor(wav)
+
+    os.makedirs(output_dir, exist_ok=True)
+    stems = {
+        "vocals": os.path.join(output_dir, "vocals.wav"),
+        "accompaniment": os.path.join(output_dir, "no_vocals.wav"),
+    }
+    sf.write(stems["vocals"], vocals.numpy().T, _model.samplerate, subtype="FLOAT")
+    sf.write(stems["accompaniment"], accompaniment.numpy().T, _model.samplerate, subtype="FLOAT")
+    return stems
+
+class SeparationPool:
+    """
+    Long-lived Demucs worker processes. Each worker loads the model once and
+    then serves separation requests, so torch import and model load are paid
+    at startup instead of per request.
+    """
+
+    def __init__(self, model_name, workers=1, torch_threads=None):
+        self.model_name = model_name
+        self.workers = workers
+        self.torch_threads = torch_threads or max(1, cpu_share() // workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                logging.info(f"Starting {self.workers} Demucs worker(s) for {self.model_name}")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.torch_threads),
+                )
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Runs fn(*args) on a warm worker and waits for the result; its CPU and memory count toward the current stage."""
+        return self._run_all([(fn, *args)])[0]
+
+    def _run_all(self, calls):
+        """Runs each (fn, *args) call on the pool at once and returns the results in order."""
+        executor = self._get_executor()
+        try:
+            futures = [executor.submit(run_in_worker, *call) for call in calls]
+            return [worker_result(future) for future in futures]
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM) or failed to load the model; drop the pool so the next call starts fresh ones
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise RuntimeError(f"Demucs worker crashed: {str(e)}")
+
+    def separate(self, input_path, output_dir):
+        """Separates input_path into vocals/accompaniment stems written to output_dir."""
+        return self.submit(_separate_file, input_path, output_dir)
+
+    def separate_array(self, wav):
+        """Separates a float32 (channels, samples) array at the model's sample rate."""
+        return self.submit(_separate_array, wav)
+
+    def warm_up(self, seconds=1.0):
+        """
+        Starts every worker (loading the model) and runs a short silent separation
+        on each, so the first request does not pay for model load or first-call setup.
+        A model that fails to load discards the pool, so a retry starts fresh workers.
+        """
+        # One task per worker at once makes the executor spawn the whole pool
+        self._run_all([(_warm_up_worker, seconds)] * self.workers)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
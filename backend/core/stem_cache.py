@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from core.utils import dir_size
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+MANIFEST = "manifest.json"
+
+class StemCache:
+    """
+    Content-addressed on-disk cache of separated stems.
+    Entries live under root/<key>/ and are published with an atomic rename,
+    so readers only ever see complete entries. A lock file serializes
+    publishing and eviction across processes; eviction is least recently
+    used first once the size budget is exceeded.
+    """
+
+    def __init__(self, root="cache/stems", max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock_path = os.path.join(self.root, ".lock")
+        self._thread_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content_hash, model_name):
+        """Builds the cache key for an input's content hash and a model."""
+        return f"{model_name}-{content_hash}"
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._thread_lock if exclusive else nullcontext():
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, key, dest_dir):
+        """
+        Places the cached stems for key into dest_dir (hard link, or copy across
+        filesystems) and returns them in the separate_tracks shape, or None on a miss.
+        """
+        entry_dir = os.path.join(self.root, key)
+        with self._locked(exclusive=False):
+            manifest_path = os.path.join(entry_dir, MANIFEST)
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                os.makedirs(dest_dir, exist_ok=True)
+                tracks = {}
+                for stem, filename in manifest["stems"].items():
+                    tracks[stem] = _link_or_copy(os.path.join(entry_dir, filename), os.path.join(dest_dir, filename))
+                os.utime(manifest_path)  # Mark as recently used
+            except (OSError, ValueError, KeyError):
+                with self._thread_lock:
+                    self.misses += 1
+                return None
+
+        with self._thread_lock:
+            self.hits += 1
+        logging.info(f"Stem cache hit: {key}")
+        return tracks
+
+    def put(self, key, tracks):
+        """Stores separated stems under key, then evicts down to the size budget."""
+        entry_dir = os.path.join(self.root, key)
+        staging_dir = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(staging_dir)
+            stems = {}
+            for stem, path in tracks.items():
+                filename = os.path.basename(path)
+                _link_or_copy(path, os.path.join(staging_dir, filename))
+                stems[stem] = filename
+            with open(os.path.join(staging_dir, MANIFEST), "w") as f:
+                json.dump({"stems": stems, "created": time.time()}, f)
+
+            with self._locked(exclusive=True):
+                if os.path.exists(entry_dir):
+                    return  # Another request stored the same content first
+                os.rename(staging_dir, entry_dir)
+        except OSError as e:
+            logging.warning(f"Could not store stems in cache: {e}")
+        finally:
+            if os.path.exists(staging_dir):
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits max_bytes."""
+        with self._locked(exclusive=True):
+            entries = []
+            for name in os.listdir(self.root):
+                entry_dir = os.path.join(self.root, name)
+                manifest_path = os.path.join(entry_dir, MANIFEST)
+                if name.startswith(".") or not os.path.exists(manifest_path):
+                    continue
+                entries.append((os.path.getmtime(manifest_path), dir_size(entry_dir), entry_dir))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                logging.info(f"Evicted stem cache entry: {entry_dir}")
+
+    def stats(self):
+        """Returns hit/miss counters and current size on disk."""
+        entries = [n for n in os.listdir(self.root) if not n.startswith(".")]
+        with self._thread_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(dir_size(os.path.join(self.root, n)) for n in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+def _link_or_copy(src, dst):
+    """Hard links src to dst, copying when linking is not possible."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
@@ -0,0 +1,57 @@
+import numpy as np
+import librosa
+
+# Max grains scattered per np.add.at call, bounds the temporary index matrix
+OVERLAP_ADD_BATCH = 256
+
+def render_meow_grain(meow_y, sr, semitone_shift, target_duration):
+    """
+    Stretches a meow to target_duration and shifts its pitch in memory.
+    Equivalent to atempo + librosa pitch_shift, but folded into a single
+    phase-vocoder pass followed by one resample.
+    """
+    target_duration = max(target_duration, 0.05)  # Avoid zero-duration
+    target_len = int(round(target_duration * sr))
+    ratio = 2.0 ** (float(semitone_shift) / 12.0)
+
+    # Stretch to target_len * ratio samples, then resample by ratio back to target_len
+    rate = len(meow_y) / (target_len * ratio)
+    stretched = librosa.effects.time_stretch(meow_y, rate=rate)
+    shifted = librosa.resample(stretched, orig_sr=float(sr) * ratio, target_sr=sr)
+    return librosa.util.fix_length(shifted, size=target_len).astype(np.float32)
+
+def overlap_add(output, grain, positions, gains):
+    """Mixes copies of grain into output at sample positions, scaled by gains."""
+    positions = np.asarray(positions, dtype=np.int64)
+    gains = np.asarray(gains, dtype=np.float32)
+    offsets = np.arange(len(grain), dtype=np.int64)
+
+    for start in range(0, len(positions), OVERLAP_ADD_BATCH):
+        pos = positions[start:start + OVERLAP_ADD_BATCH]
+        idx = pos[:, None] + offsets[None, :]
+        contrib = gains[start:start + OVERLAP_ADD_BATCH, None] * grain[None, :]
+        mask = idx < len(output)  # Grains running past the end are truncated
+        np.add.at(output, idx[mask], contrib[mask])
+    return output
+
+def synthesize_meow_track(grain_bank, num_samples, positions, semitone_shifts, gains, grain_duration):
+    """
+    Renders a full meow track into one preallocated float32 buffer.
+    Shifts are snapped to the grain bank's step so each distinct grain is
+    fetched once and mixed at all of its positions with overlap-add.
+    """
+    output = np.zeros(num_samples, dtype=np.float32)
+    if len(positions) == 0:
+        return output
+
+    keys = grain_bank.quantize(semitone_shifts)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    positions = np.asarray(positions, dtype=np.int64)
+    gains = np.asarray(gains, dtype=np.float32)
+    duration_ms = int(round(grain_duration * 1000))
+
+    for k, key in enumerate(unique_keys):
+        grain = grain_bank.get_quantized(key, duration_ms)
+        members = inverse == k
+        overlap_add(output, grain, positions[members], gains[members])
+    return output
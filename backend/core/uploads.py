@@ -0,0 +1,157 @@
+import os
+import json
+import zipfile
+import hashlib
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+ZIP_MAGIC = b"PK\x03\x04"
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+class UnsupportedMediaError(Exception):
+    """Raised when an upload does not look like an audio or video file."""
+
+def sniff_media_type(header: bytes):
+    """Identifies common audio/video containers from their first bytes, or returns None."""
+    if header[:4] == b"RIFF" and header[8:12] in (b"WAVE", b"AVI "):
+        return "wav" if header[8:12] == b"WAVE" else "avi"
+    if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if header[4:8] == b"ftyp":
+        return "mp4"  # Also m4a/mov
+    if header[:3] == b"ID3":
+        return "mp3"
+    if len(header) >= 2 and header[0] == 0xFF and (header[1] & 0xE0) == 0xE0:
+        return "mpeg"  # MP3 frame sync or ADTS AAC
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "matroska"  # Also webm
+    if header[:4] == b"caff":
+        return "caf"
+    if header[:5] == b"#!AMR":
+        return "amr"
+    if header[:4] == b"\x30\x26\xb2\x75":
+        return "asf"  # wma/wmv
+    return None
+
+def sniff_archive_type(header: bytes):
+    """Identifies a zip archive from its first bytes, or returns None."""
+    return "zip" if header[:4] == ZIP_MAGIC else None
+
+async def stream_upload(file, dest_path, max_bytes, chunk_size=UPLOAD_CHUNK_SIZE,
+                        sniff=sniff_media_type, kind="audio or video"):
+    """
+    Copies an UploadFile to dest_path in fixed-size chunks, hashing it on the way.
+    Rejects content sniff does not recognize from the first chunk and stops once
+    max_bytes is exceeded. Returns (size, sha256 hex digest); dest_path is removed on failure.
+    By now Starlette has spooled the whole multipart body, so this only keeps the copy
+    bounded; BodySizeLimitMiddleware is what refuses oversize requests before they are read.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit.")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0 and sniff(chunk[:16]) is None:
+                    raise UnsupportedMediaError(f"Uploaded file is not a supported {kind} format.")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit.")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise UnsupportedMediaError("Uploaded file is empty.")
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return size, digest.hexdigest()
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware answering 413 before the body is read when a request's
+    Content-Length exceeds the limit for its path. limits maps paths to bytes;
+    other paths are not checked. Chunked requests carry no length and fall
+    through to the per-file check in stream_upload.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is not None:
+            length = dict(scope["headers"]).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > limit:
+                body = json.dumps({"detail": f"Request body exceeds the {limit // (1024 * 1024)} MB limit."}).encode()
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close"),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+def list_archive_members(archive_path, max_items):
+    """
+    Names of the files in a zip archive, skipping directories and metadata
+    entries (__MACOSX/, dotfiles). Raises UploadTooLargeError above max_items.
+    """
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            names = [
+                info.filename for info in archive.infolist()
+                if not info.is_dir() and not any(
+                    part.startswith(".") or part == "__MACOSX" for part in info.filename.split("/")
+                )
+            ]
+    except zipfile.BadZipFile as e:
+        raise UnsupportedMediaError(f"Uploaded archive is not a valid zip file: {e}")
+    if len(names) > max_items:
+        raise UploadTooLargeError(f"Archive holds {len(names)} files, the limit is {max_items}.")
+    return names
+
+def extract_archive_member(archive_path, name, dest_path, max_bytes, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Streams one archive member to dest_path with the same checks as uploads:
+    media sniffing on the first chunk and a limit on the decompressed size, so
+    a zip bomb stops at max_bytes. Returns (size, sha256 hex digest).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with zipfile.ZipFile(archive_path) as archive, archive.open(name) as source, open(dest_path, "wb") as f:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0 and sniff_media_type(chunk[:16]) is None:
+                    raise UnsupportedMediaError(f"{name} is not a supported audio or video format.")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"{name} exceeds the {max_bytes // (1024 * 1024)} MB limit.")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise UnsupportedMediaError(f"{name} is empty.")
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return size, digest.hexdigest()
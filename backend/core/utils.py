@@ -1,35 +1,83 @@
 import os
+import hashlib
 import subprocess
-import numpy as np
-from pydub import AudioSegment
-import librosa
-
-def pitch_shift_segment(segment, semitone_shift):
-    """Shifts the pitch of a pydub AudioSegment while preserving timing."""
-    samples = np.array(segment.get_array_of_samples()).astype(np.float32)
-    samples /= 32768.0  # Normalize to -1.0 to 1.0
-    shifted = librosa.effects.pitch_shift(samples, sr=segment.frame_rate, n_steps=semitone_shift)
-    shifted = np.int16(shifted * 32768)
-    return AudioSegment(
-        shifted.tobytes(),
-        frame_rate=segment.frame_rate,
-        sample_width=shifted.dtype.itemsize,
-        channels=1
-    )
-
-def stretch_meow_ffmpeg(input_audio, target_duration, output_file):
-    """Uses FFmpeg to stretch or shrink meow sound to match the target duration."""
-    original_duration = len(input_audio) / 1000.0
-    target_duration = max(target_duration, 0.05)  # Avoid zero-duration
-    desired_factor = original_duration / target_duration
-
-    temp_input = "temp_meow.wav"
-    input_audio.export(temp_input, format="wav")
-    command = ["ffmpeg", "-y", "-i", temp_input, "-filter:a", f"atempo={desired_factor:.3f}", output_file]
-    subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if os.path.exists(temp_input):
-        os.remove(temp_input)
-        print(f"🗑️ Deleted temp file: {temp_input}")
-
-    return AudioSegment.from_file(output_file)
\ No newline at end of file
+
+# Audio libraries are imported inside the functions that need them, so importing
+# this module (and everything that uses its file helpers) stays cheap at startup.
+
+def cpu_share():
+    """
+    Cores this server process may use: os.cpu_count() split evenly across the
+    WEB_CONCURRENCY uvicorn workers, so their pools do not oversubscribe the machine.
+    """
+    web_workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hashes a file's content in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_media_duration(path):
+    """Returns a media file's duration in seconds from its header (soundfile, else ffprobe)."""
+    import soundfile as sf
+
+    try:
+        return sf.info(path).duration
+    except RuntimeError:
+        pass  # Not a libsndfile format (mp4, webm, ...)
+
+    command = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFprobe failed: {result.stderr}")
+    return float(result.stdout.strip() or 0)
+
+# Codec settings for client-facing files; internal stems stay float32 WAV
+DELIVERY_FORMATS = {
+    "wav": ["-c:a", "pcm_s16le"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "320k"],
+    "flac": ["-c:a", "flac", "-sample_fmt", "s16"],
+    "opus": ["-c:a", "libopus", "-b:a", "160k"],
+}
+
+def encode_for_delivery(input_path, output_format):
+    """
+    Encodes an internal audio file into the client-requested format next to it.
+    Lossy encoding only happens here, once, at the edge of the pipeline.
+    """
+    if output_format not in DELIVERY_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    import soundfile as sf
+
+    base, ext = os.path.splitext(input_path)
+    if ext.lower() == f".{output_format}":
+        # Already a 16-bit WAV (e.g. the final mix) needs no re-encode
+        if output_format != "wav" or sf.info(input_path).subtype == "PCM_16":
+            return input_path
+        base = f"{base}_pcm16"
+
+    output_path = f"{base}.{output_format}"
+    command = ["ffmpeg", "-y", "-i", input_path, *DELIVERY_FORMATS[output_format], output_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        raise RuntimeError(f"FFmpeg encode failed: {result.stderr}")
+    return output_path
+
+def dir_size(path):
+    """Total size in bytes of the files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
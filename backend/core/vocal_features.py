@@ -0,0 +1,75 @@
+import os
+import logging
+import threading
+import librosa
+import numpy as np
+from core.metrics import measure
+from core.pitch_tracking import PitchTracker, HOP_LENGTH
+
+class VocalFeatures:
+    """
+    A decoded mono vocal stem and its frame-level analysis (hop HOP_LENGTH),
+    computed once and shared by every voice transform rendering it.
+    """
+
+    def __init__(self, samples, sr, f0, voiced, rms, times):
+        self.samples = samples
+        self.sr = sr
+        self.f0 = f0  # Hz, 0 where unvoiced or undetected
+        self.voiced = voiced
+        self.rms = rms
+        self.times = times
+        self._onsets = None
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sr
+
+    @property
+    def onsets(self):
+        """Onset frame indices, detected on first use since not every transform needs them."""
+        if self._onsets is None:
+            self._onsets = librosa.onset.onset_detect(
+                y=self.samples, sr=self.sr, hop_length=HOP_LENGTH, units="frames"
+            )
+        return self._onsets
+
+class VocalFeatureExtractor:
+    """
+    Decodes vocal stems and runs pitch/voicing/RMS analysis. Nothing is kept
+    between calls: the caller holds the VocalFeatures for as long as its
+    transforms need them (one request), so decoded stems are freed with it.
+    """
+
+    def __init__(self, sr=44100, pitch_tracker=None):
+        self.sr = sr
+        self.pitch_tracker = pitch_tracker or PitchTracker(
+            method=os.getenv("PITCH_METHOD", "pyin"),
+            workers=int(os.getenv("PITCH_WORKERS", "0")) or None,
+            chunk_seconds=float(os.getenv("PITCH_CHUNK_SECONDS", "30"))
+        )
+
+    def extract(self, path):
+        """Decodes a stem file and returns its VocalFeatures."""
+        samples, _ = librosa.load(path, sr=self.sr)
+        features = self.analyze(samples, self.sr)
+        logging.info(f"Vocal features for {path}: {int(np.sum(features.voiced))} voiced of {len(features.f0)} frames")
+        return features
+
+    def analyze(self, samples, sr):
+        """Analyzes an in-memory mono signal (e.g. one window of a long stem)."""
+        # Chunked across cores, NaN pitch already mapped to 0
+        with measure("pitch"):
+            f0, voiced, rms, times = self.pitch_tracker.track(samples, sr)
+        return VocalFeatures(samples, sr, f0, voiced, rms, times)
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_extractor():
+    """The process-wide extractor every registered version uses."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = VocalFeatureExtractor()
+        return _shared
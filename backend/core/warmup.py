@@ -0,0 +1,92 @@
+import os
+import time
+import logging
+import threading
+
+WARMUP_STEPS = ("model", "pitch", "meow")
+
+def configured_steps():
+    """Warm-up steps from WARMUP (comma separated, "none" to skip), in WARMUP_STEPS order."""
+    value = os.getenv("WARMUP", ",".join(WARMUP_STEPS)).strip().lower()
+    if value in ("", "0", "none", "false"):
+        return []
+    requested = {step.strip() for step in value.split(",") if step.strip()}
+    unknown = requested - set(WARMUP_STEPS)
+    if unknown:
+        raise ValueError(f"Unknown warm-up step(s): {', '.join(sorted(unknown))}")
+    return [step for step in WARMUP_STEPS if step in requested]
+
+class Warmup:
+    """
+    Runs the configured warm-up steps once on a background thread and reports
+    progress for the readiness probe. Steps are callables keyed by name; the
+    instance is ready when every step has finished without error. A failing
+    step is retried with exponential backoff; once it has used up its retries
+    the warm-up is failed for good and the liveness probe reports it.
+    """
+
+    def __init__(self, steps, retries=None, retry_delay=None):
+        self.steps = steps  # name -> callable, run in order
+        self.retries = int(os.getenv("WARMUP_RETRIES", "3")) if retries is None else retries
+        self.retry_delay = float(os.getenv("WARMUP_RETRY_DELAY", "5")) if retry_delay is None else retry_delay
+        self.state = "pending"
+        self.results = {name: {"status": "pending"} for name in steps}
+        self.started = None
+        self.finished = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts warm-up in the background (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        self.state = "running"
+        self.started = time.time()
+        for name, step in self.steps.items():
+            if not self._run_step(name, step):
+                self.state = "failed"
+                self.finished = time.time()
+                return
+        self.state = "ready"
+        self.finished = time.time()
+
+    def _run_step(self, name, step):
+        """Runs one step, retrying transient failures (e.g. a model download) with backoff."""
+        for attempt in range(self.retries + 1):
+            self.results[name] = {"status": "running", "attempt": attempt + 1}
+            step_start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                if attempt == self.retries:
+                    logging.error(f"Warm-up step {name} failed after {attempt + 1} attempt(s): {e}")
+                    self.results[name] = {"status": "failed", "attempts": attempt + 1, "error": str(e)}
+                    return False
+                delay = self.retry_delay * 2 ** attempt
+                logging.warning(f"Warm-up step {name} failed ({e}), retrying in {delay:g}s")
+                self.results[name] = {"status": "retrying", "attempts": attempt + 1, "error": str(e)}
+                time.sleep(delay)
+                continue
+            seconds = round(time.perf_counter() - step_start, 3)
+            self.results[name] = {"status": "done", "seconds": seconds, "attempts": attempt + 1}
+            logging.info(f"Warm-up step {name} finished in {seconds}s")
+            return True
+
+    def is_ready(self):
+        return self.state == "ready"
+
+    def has_failed(self):
+        """True once a step has used up its retries; the process will never become ready."""
+        return self.state == "failed"
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "steps": self.results,
+            "seconds": round(self.finished - self.started, 3) if self.started and self.finished else None,
+        }
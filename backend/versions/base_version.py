@@ -1,12 +1,29 @@
 from abc import ABC, abstractmethod
 
 class BaseVersion(ABC):
+    # Mode name clients select (e.g. "Cat Version"); classes without one are not registered
+    name = None
+    # Response key for the final mix
+    output_name = None
+
     @abstractmethod
-    def generate_transformed_vocals(self, vocal_file: str, output_file: str):
-        """Transform vocals based on version-specific logic"""
+    def generate_transformed_vocals(self, vocal_file: str, output_file: str, features=None, **options):
+        """Transform vocals based on version-specific logic (features: shared VocalFeatures, if analyzed)"""
         pass
 
     @abstractmethod
     def merge_with_instrumental(self, instrumental_file: str, transformed_vocals_file: str, output_file: str):
         """Merge the transformed vocals with the instrumental"""
-        pass
\ No newline at end of file
+        pass
+
+    def warm_up(self):
+        """Optional: load samples or build caches before the first request"""
+        pass
+
+    def stats(self):
+        """Optional: cache counters for /stats"""
+        return None
+
+    def shutdown(self):
+        """Optional: stop worker pools"""
+        pass
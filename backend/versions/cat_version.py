@@ -1,110 +1,171 @@
 import os
+import threading
 import librosa
 import numpy as np
-from pydub import AudioSegment
-from core.utils import pitch_shift_segment, stretch_meow_ffmpeg
- 
-class CatVersion:
+import soundfile as sf
+from core.grain_bank import MeowGrainBank
+from core.meow_sample import load_meow_sample
+from core.metrics import measure
+from core.mixer import mix_tracks
+from core.segmented import should_segment, decode_to_wav, iter_windows, CrossfadeWriter
+from core.synthesis import synthesize_meow_track
+from core.utils import get_media_duration
+from core.vocal_features import shared_extractor
+from versions.base_version import BaseVersion
+ 
+class CatVersion(BaseVersion):
+    name = "Cat Version"
+    output_name = "final_meow_music"
+
     def __init__(self):
-        self.MEOW_FILE = "data/cat/meow.wav"
+        self.SAMPLE_DIR = "data/cat"
+        self.MEOW_FILE = os.path.join(self.SAMPLE_DIR, os.getenv("MEOW_SAMPLE", "meow.wav"))
         self.SAMPLE_RATE = 44100
- 
-    def generate_meow_vocals(self, vocal_file: str, output_meow_vocal: str):
-        temp_files = []
+        self.MIN_MEOW_DURATION = 0.3  # 300 ms minimum meow sound
+        self.SHIFT_STEP = float(os.getenv("MEOW_SHIFT_STEP", "0.25"))  # Grain bank semitone step
+        self.GRAIN_CACHE_SIZE = int(os.getenv("MEOW_GRAIN_CACHE_SIZE", "512"))
+        self.GRAIN_CACHE_DIR = os.getenv("MEOW_GRAIN_CACHE_DIR", "data/cache/grains")  # Empty disables persistence
+        # Analysis is shared with the other versions so a stem is only tracked once
+        self.feature_extractor = shared_extractor()
+        self.pitch_tracker = self.feature_extractor.pitch_tracker
+        self.MIX_LIMIT = os.getenv("MIX_LIMIT", "clip")  # clip, peak, soft or none
+        self.MEOW_GAIN_DB = float(os.getenv("MIX_MEOW_GAIN_DB", "0"))
+        self.INSTRUMENTAL_GAIN_DB = float(os.getenv("MIX_INSTRUMENTAL_GAIN_DB", "0"))
+        self.samples = {}  # Sample name -> MeowSample
+        self.grain_banks = {}  # Sample name -> MeowGrainBank
+        self._lock = threading.Lock()
+
+    def available_samples(self):
+        """Lists the meow samples that can be selected by name."""
+        if not os.path.isdir(self.SAMPLE_DIR):
+            return []
+        return sorted(f for f in os.listdir(self.SAMPLE_DIR) if f.lower().endswith(".wav"))
+
+    def get_sample(self, sample_name=None):
+        """Returns the analyzed meow sample, loading it once per instance."""
+        sample_name = sample_name or os.path.basename(self.MEOW_FILE)
+        with self._lock:
+            sample = self.samples.get(sample_name)
+            if sample is None:
+                if sample_name not in self.available_samples():
+                    raise ValueError(f"Unknown meow sample: {sample_name}")
+                sample = load_meow_sample(os.path.join(self.SAMPLE_DIR, sample_name), self.SAMPLE_RATE)
+                self.samples[sample_name] = sample
+            return sample
+
+    def get_grain_bank(self, sample_name=None):
+        """Returns the grain bank for a meow sample, creating it on first use."""
+        sample_name = sample_name or os.path.basename(self.MEOW_FILE)
+        sample = self.get_sample(sample_name)
+        with self._lock:
+            grain_bank = self.grain_banks.get(sample_name)
+            if grain_bank is None:
+                grain_bank = MeowGrainBank(
+                    sample.samples, self.SAMPLE_RATE, step=self.SHIFT_STEP,
+                    max_entries=self.GRAIN_CACHE_SIZE, cache_dir=self.GRAIN_CACHE_DIR or None
+                )
+                self.grain_banks[sample_name] = grain_bank
+            return grain_bank
+ 
+    def generate_transformed_vocals(self, vocal_file: str, output_file: str, features=None, sample_name: str = None, **options):
+        self.generate_meow_vocals(vocal_file, output_file, sample_name, features)
+
+    def merge_with_instrumental(self, instrumental_file: str, transformed_vocals_file: str, output_file: str):
+        self.merge_meow_with_instrumental(instrumental_file, transformed_vocals_file, output_file)
+
+    def generate_meow_vocals(self, vocal_file: str, output_meow_vocal: str, sample_name: str = None, features=None):
         print("🔹 Extracting pitch and amplitude directly from vocal file...")
  
-        # Load vocal file
-        vocal_y, sr = librosa.load(vocal_file, sr=self.SAMPLE_RATE)
-        print(f"📊 Vocal waveform shape: {vocal_y.shape}, Sample rate: {sr}")
+        if features is None and should_segment(get_media_duration(vocal_file)):
+            self.generate_meow_vocals_segmented(vocal_file, output_meow_vocal, sample_name)
+            return
  
-        # Extract pitch (pyin) and amplitude
-        vocal_f0, vocal_voiced_flag, _ = librosa.pyin(
-            vocal_y, fmin=librosa.note_to_hz('C2'),
-            fmax=librosa.note_to_hz('C7'), sr=sr
-        )
-        vocal_amplitude = librosa.feature.rms(y=vocal_y)[0]
-        vocal_times = librosa.times_like(vocal_f0, sr=sr)
+        # Decoded and analyzed once per stem, shared with any other version rendering it
+        features = features or self.feature_extractor.extract(vocal_file)
+        print(f"📊 Vocal waveform shape: {features.samples.shape}, Sample rate: {features.sr}")
  
-        # Handle NaNs in pitch extraction
-        vocal_f0 = np.where(np.isnan(vocal_f0), 0, vocal_f0)
+        final_meow = self.render_meow(features, sample_name)
+ 
+        # Export final meow vocals (float, it is only an intermediate for the merge)
+        sf.write(output_meow_vocal, final_meow, features.sr, subtype="FLOAT")
+        print(f"\n✅ Final Meow Vocal File Saved: {output_meow_vocal}")
+ 
+    def generate_meow_vocals_segmented(self, vocal_file: str, output_meow_vocal: str, sample_name: str = None):
+        """Renders meows window by window and crossfades them, keeping memory flat for long inputs."""
+        decoded_path = f"{output_meow_vocal}.input.wav"
+        decode_to_wav(vocal_file, decoded_path, self.SAMPLE_RATE, 1)
+        writer = None
+        try:
+            for window, overlap in iter_windows(decoded_path, self.SAMPLE_RATE):
+                if writer is None:
+                    writer = CrossfadeWriter(output_meow_vocal, self.SAMPLE_RATE, 1, overlap)
+                writer.write(self.render_meow_vocals(window[:, 0], self.SAMPLE_RATE, sample_name))
+        finally:
+            if writer is not None:
+                writer.close()
+            os.remove(decoded_path)
+        print(f"\n✅ Final Meow Vocal File Saved (segmented): {output_meow_vocal}")
+ 
+    def render_meow_vocals(self, vocal_y, sr, sample_name: str = None):
+        """Builds the meow track for a mono vocal signal and returns it as float32 samples."""
+        return self.render_meow(self.feature_extractor.analyze(vocal_y, sr), sample_name)
+
+    def render_meow(self, features, sample_name: str = None):
+        """Builds the meow track from analyzed vocal features."""
+        sr = features.sr
+        vocal_f0, vocal_voiced_flag = features.f0, features.voiced
+        vocal_amplitude, vocal_times = features.rms, features.times
  
         print(f"🧮 Extracted pitch points: {np.sum(vocal_voiced_flag)}")
         print(f"🧮 Total frames: {len(vocal_f0)}")
  
-        # Load Meow sample and extract its pitch
-        meow_y, _ = librosa.load(self.MEOW_FILE, sr=self.SAMPLE_RATE)
-        meow_f0, meow_voiced, _ = librosa.pyin(
-            meow_y, fmin=librosa.note_to_hz('C2'),
-            fmax=librosa.note_to_hz('C7'), sr=self.SAMPLE_RATE
-        )
-        ref_meow_pitch = np.nanmean(meow_f0[meow_voiced]) if np.any(meow_voiced) else 300
+        # Meow sample and its pitch are analyzed once and cached
+        meow_sample = self.get_sample(sample_name)
+        ref_meow_pitch = meow_sample.ref_pitch
         print(f"🎵 Reference Meow Pitch (Hz): {ref_meow_pitch:.2f}")
  
-        # Convert Meow to Pydub AudioSegment
-        meow_audio = AudioSegment.from_file(self.MEOW_FILE)
- 
-        # Prepare empty audio for final meow track
-        vocal_duration = librosa.get_duration(y=vocal_y, sr=sr)
-        final_meow_audio = AudioSegment.silent(duration=int(vocal_duration * 1000))
- 
-        # Adjusted minimum duration for each meow
-        min_meow_duration = 0.3  # 300 ms minimum meow sound
- 
-        # Generate meows based on pitch contour
-        for i, pitch in enumerate(vocal_f0):
-            if pitch == 0 or not vocal_voiced_flag[i]:
-                continue  # Skip unvoiced parts
- 
-            time_stamp = vocal_times[i]
-            amplitude = vocal_amplitude[i] if i < len(vocal_amplitude) else 0.5
- 
-            # Calculate pitch shift and clip it
-            pitch_shift = librosa.hz_to_midi(pitch) - librosa.hz_to_midi(ref_meow_pitch)
-            # pitch_shift = np.clip(pitch_shift, -3, 3)
- 
-            # Use a meaningful frame duration (avoid too short sounds)
-            frame_duration = max(librosa.frames_to_time(5, sr=sr), min_meow_duration)
- 
-            # Stretch meow to match the frame duration
-            temp_out = f"temp_meow_{i}.wav"
-            temp_files.append(temp_out)
- 
-            meow_stretched = stretch_meow_ffmpeg(meow_audio, frame_duration, temp_out)
-            final_meow = pitch_shift_segment(meow_stretched, pitch_shift)
- 
-            # Adjust volume based on vocal amplitude
-            final_meow = final_meow + (20 * np.log10(amplitude + 1e-6))
- 
-            # Overlay meow onto final track
-            position = int(time_stamp * 1000)
-            final_meow_audio = final_meow_audio.overlay(final_meow, position=position)
- 
-        # Export final meow vocals
-        final_meow_audio.export(output_meow_vocal, format="wav")
-        print(f"\n✅ Final Meow Vocal File Saved: {output_meow_vocal}")
- 
-        # Cleanup temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
-                print(f"🗑️ Deleted temp file: {temp_file}")
- 
+        frame_duration = self.meow_grain_duration(sr)
+ 
+        # Voiced frames drive one meow each
+        frames = np.flatnonzero((vocal_f0 > 0) & vocal_voiced_flag)
+        amplitudes = np.full(len(frames), 0.5, dtype=np.float32)
+        in_range = frames < len(vocal_amplitude)
+        amplitudes[in_range] = vocal_amplitude[frames[in_range]]
+        pitch_shifts = librosa.hz_to_midi(vocal_f0[frames]) - librosa.hz_to_midi(ref_meow_pitch)
+        positions = np.round(vocal_times[frames] * sr).astype(np.int64)
+ 
+        # Volume follows vocal amplitude (same as a +20*log10(amplitude) dB gain)
+        gains = amplitudes + 1e-6
+ 
+        grain_bank = self.get_grain_bank(sample_name)
+        with measure("synthesize"):
+            final_meow = synthesize_meow_track(
+                grain_bank, len(features.samples), positions, pitch_shifts, gains, frame_duration
+            )
+        print(f"🎛️ Grain bank: {grain_bank.stats()}")
+        return final_meow
+ 
+    def meow_grain_duration(self, sr):
+        """Length of each meow grain; a meaningful frame duration (avoid too short sounds)."""
+        return max(librosa.frames_to_time(5, sr=sr), self.MIN_MEOW_DURATION)
+
+    def warm_up(self, min_shift=-12, max_shift=12):
+        """Loads every meow sample's analysis and prebuilds its grains for the given shift range."""
+        for sample_name in self.available_samples():
+            self.get_grain_bank(sample_name).prebuild(min_shift, max_shift, self.meow_grain_duration(self.SAMPLE_RATE))
+
     def merge_meow_with_instrumental(self, instrumental_file: str, meow_vocal_file: str, output_final_mix: str):
         print("\n🔹 Merging meow vocals with instrumental...")
-        instrumental = AudioSegment.from_file(instrumental_file)
-        meow_vocal = AudioSegment.from_file(meow_vocal_file)
- 
-        instr_duration = librosa.get_duration(path=instrumental_file)
-        meow_duration = librosa.get_duration(path=meow_vocal_file)
- 
-        # Align durations
-        if instr_duration > meow_duration:
-            instrumental = instrumental[:int(meow_duration * 1000)]
-        elif meow_duration > instr_duration:
-            silence = AudioSegment.silent(duration=int((meow_duration - instr_duration) * 1000))
-            instrumental += silence
- 
-        # Overlay meows on instrumental
-        final_mix = instrumental.overlay(meow_vocal)
-        final_mix.export(output_final_mix, format="wav")
-        print(f"\n✅ Final Meow Music Saved: {output_final_mix}")
\ No newline at end of file
+        # One decode per input, sample-accurate alignment to the meow track, block-wise write
+        mix_tracks(
+            instrumental_file, meow_vocal_file, output_final_mix,
+            base_gain_db=self.INSTRUMENTAL_GAIN_DB, overlay_gain_db=self.MEOW_GAIN_DB,
+            limit=self.MIX_LIMIT
+        )
+        print(f"\n✅ Final Meow Music Saved: {output_final_mix}")
+
+    def stats(self):
+        return {"grain_banks": {name: bank.stats() for name, bank in self.grain_banks.items()}}
+
+    def shutdown(self):
+        self.pitch_tracker.shutdown()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import inspect
+import logging
+import pkgutil
+import importlib
+import threading
+from versions.base_version import BaseVersion
+
+# Modules in versions/ that hold infrastructure rather than transforms
+_SKIP_MODULES = {"base_version", "registry"}
+
+_classes = None  # Version name -> class, filled on first use
+_instances = {}
+_lock = threading.Lock()
+
+def discover():
+    """
+    Imports every module in the versions package and returns {name: class}
+    for each BaseVersion subclass that declares a name. A module that fails to
+    import is logged and skipped so one broken transform cannot take down the rest.
+    """
+    import versions
+
+    found = {}
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        if module_info.name in _SKIP_MODULES:
+            continue
+        module_name = f"versions.{module_info.name}"
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            logging.error(f"Could not load voice transform module {module_name}: {e}")
+            continue
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if not issubclass(cls, BaseVersion) or cls.__module__ != module_name or not cls.name:
+                continue
+            if cls.name in found:
+                raise ValueError(f"Duplicate version name {cls.name!r} in {module_name}")
+            found[cls.name] = cls
+    return found
+
+def _registered():
+    global _classes
+    with _lock:
+        if _classes is None:
+            _classes = discover()
+            logging.info(f"Voice transforms: {', '.join(_classes) or 'none'}")
+        return _classes
+
+def version_names():
+    """Names of every discovered version, in discovery order."""
+    return list(_registered())
+
+def get_version(name):
+    """Returns the shared instance of a version, creating it on first use."""
+    classes = _registered()
+    if name not in classes:
+        raise ValueError(f"Unknown version: {name}")
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            instance = classes[name]()
+            _instances[name] = instance
+        return instance
+
+def loaded_versions():
+    """Versions instantiated so far, by name."""
+    with _lock:
+        return dict(_instances)
+
+def stats():
+    """Cache counters of each loaded version, or None while none has been created."""
+    loaded = loaded_versions()
+    return {name: version.stats() for name, version in loaded.items()} if loaded else None
+
+def shutdown():
+    for version in loaded_versions().values():
+        version.shutdown()